@@ -0,0 +1,84 @@
+"""
+ASGI entry point: uvicorn asgi:app --workers 4
+
+/get-map is handled natively so a request waiting on inference holds no
+thread, only a Future from the bounded inference pool. plan_map runs on a
+worker thread: registry.get() may load or reload the model and features,
+and the shared cache lookup reads a file, and neither may block the event
+loop. Every other route is the Flask app run through asgiref's
+WSGI adapter.
+"""
+
+import asyncio
+import time
+from urllib.parse import parse_qsl
+
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.datastructures import MIMEAccept, MultiDict
+from werkzeug.http import parse_accept_header, parse_etags
+
+from inference import Overloaded, inference_pool
+from main import MapJob, overloaded, plan_map, unavailable
+from main import app as flask_app
+from metrics import REQUEST_SECONDS
+from registry import ModelUnavailable
+
+wsgi_app = WsgiToAsgi(flask_app)
+
+
+async def send_response(send, body, status, headers):
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    headers = {"Content-Type": "text/html; charset=utf-8", **headers}
+    headers["Content-Length"] = str(len(body))
+    headers["Access-Control-Allow-Origin"] = "*"
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def get_map(scope, send):
+    start = time.perf_counter()
+    try:
+        await _get_map(scope, send)
+    finally:
+        REQUEST_SECONDS.observe("/get-map", time.perf_counter() - start)
+
+
+async def _get_map(scope, send):
+    request_headers = {k.decode().lower(): v.decode() for k, v in scope["headers"]}
+    args = MultiDict(parse_qsl(scope["query_string"].decode()))
+    accept = parse_accept_header(request_headers.get("accept"), MIMEAccept)
+    if_none_match = parse_etags(request_headers.get("if-none-match"))
+
+    try:
+        plan = await asyncio.to_thread(plan_map, args, accept, if_none_match)
+    except ModelUnavailable as e:
+        await send_response(send, *unavailable(e))
+        return
+    if not isinstance(plan, MapJob):
+        await send_response(send, *plan)
+        return
+    try:
+        future = inference_pool.submit(plan.key, plan.run)
+    except Overloaded:
+        await send_response(send, *overloaded())
+        return
+    body = await asyncio.wrap_future(future)
+    await send_response(send, body, 200, plan.headers)
+
+
+async def app(scope, receive, send):
+    if (
+        scope["type"] == "http"
+        and scope["path"] == "/get-map"
+        and scope["method"] == "GET"
+    ):
+        await get_map(scope, send)
+    else:
+        await wsgi_app(scope, receive, send)
@@ -0,0 +1,103 @@
+import csv
+import io
+import json
+
+import numpy as np
+
+MAX_BATCH_POINTS = 200_000
+DEFAULT_YEARS = 1.0
+# result lines per chunk written to the streamed response
+STREAM_CHUNK = 2000
+
+LAT_COLUMNS = ("lat", "latitude")
+LON_COLUMNS = ("lon", "lng", "longitude")
+
+
+def _column(header, names):
+    for i, name in enumerate(header):
+        if name.strip().lower() in names:
+            return i
+    return None
+
+
+def parse_csv(text):
+    """lat,lon[,years] rows with a header line; extra columns are ignored."""
+    lines = io.StringIO(text)
+    header = next(csv.reader(lines), None)
+    if header is None:
+        raise ValueError("empty body")
+    lat_i = _column(header, LAT_COLUMNS)
+    lon_i = _column(header, LON_COLUMNS)
+    years_i = _column(header, ("years",))
+    if lat_i is None or lon_i is None:
+        raise ValueError("CSV header needs lat and lon columns")
+
+    rows = lines.read()
+    if not rows.strip():
+        raise ValueError("no points")
+    usecols = [lat_i, lon_i] + ([years_i] if years_i is not None else [])
+    table = np.loadtxt(io.StringIO(rows), delimiter=",", usecols=usecols, ndmin=2)
+    years = table[:, 2] if years_i is not None else np.full(len(table), DEFAULT_YEARS)
+    return table[:, 0], table[:, 1], years
+
+
+def parse_json(data):
+    """
+    [[lat, lon(, years)], ...] or [{"lat", "lon"(, "years")}, ...], either
+    bare or under a "points" key.
+    """
+    if isinstance(data, dict):
+        data = data.get("points")
+    if not isinstance(data, list):
+        raise ValueError("expected a list of points")
+    if data and isinstance(data[0], dict):
+        data = [[p["lat"], p["lon"], p.get("years", DEFAULT_YEARS)] for p in data]
+    else:
+        data = [p if len(p) == 3 else [p[0], p[1], DEFAULT_YEARS] for p in data]
+    table = np.array(data, dtype=np.float64).reshape(-1, 3)
+    return table[:, 0], table[:, 1], table[:, 2]
+
+
+def parse_points(body, content_type):
+    """Return (lats, lons, years) float arrays; ValueError on a bad body."""
+    text = body.decode("utf-8")
+    try:
+        if content_type.startswith("text/csv"):
+            lats, lons, years = parse_csv(text)
+        else:
+            lats, lons, years = parse_json(json.loads(text))
+    except (KeyError, IndexError, TypeError) as e:
+        raise ValueError(f"malformed point: {e}") from e
+
+    if len(lats) == 0:
+        raise ValueError("no points")
+    if len(lats) > MAX_BATCH_POINTS:
+        raise ValueError(f"at most {MAX_BATCH_POINTS:,} points per request")
+    # NaN and inf fail these comparisons too; the ranges also keep the
+    # per-cell keys in score_points (row * 100_000 + col + 50_000) unique
+    if not ((np.abs(lats) <= 90).all() and (np.abs(lons) <= 180).all()):
+        raise ValueError("latitude must be in [-90, 90] and longitude in [-180, 180]")
+    if not (np.isfinite(years).all() and (years >= 0).all()):
+        raise ValueError("years must be finite and non-negative")
+    return lats, lons, years
+
+
+def stream_ndjson(lats, lons, fire_rates, probs):
+    columns = (lats.tolist(), lons.tolist(), fire_rates.tolist(), probs.tolist())
+    for start in range(0, len(columns[0]), STREAM_CHUNK):
+        end = start + STREAM_CHUNK
+        yield "".join(
+            f'{{"lat":{lat},"lon":{lon},"fire_rate":{rate},"prob":{prob}}}\n'
+            for lat, lon, rate, prob in zip(*(c[start:end] for c in columns))
+        )
+
+
+def stream_csv(lats, lons, fire_rates, probs):
+    yield "lat,lon,fire_rate,prob\n"
+    columns = (lats.tolist(), lons.tolist(), fire_rates.tolist(), probs.tolist())
+    for start in range(0, len(columns[0]), STREAM_CHUNK):
+        end = start + STREAM_CHUNK
+        yield "".join(
+            f"{lat},{lon},{rate},{prob}\n"
+            for lat, lon, rate, prob in zip(*(c[start:end] for c in columns))
+        )
@@ -0,0 +1,264 @@
+"""
+Offline benchmark suite for the serving paths.
+
+Runs against the committed ml/model.ubj (base features) and land_cover.csv,
+with the risk raster and the response cache out of the way unless a case
+is about them, and times:
+
+  load.*          model, land cover and feature store loading
+  cold.get_map    a fresh interpreter up to its first /get-map response
+  get_map.*       warm /get-map through Flask's test client, map sides from
+                  the default 5x5 up to MAX_MAP_SIDE, each on uncached cells
+  get_map.cached  the same 5x5 map again, answered from the response cache
+  predict_batch.* /predict-batch with growing numbers of points
+  ml.predict      predict() from ml/predict.py, which loads everything per call
+
+Results go to a JSON file with each case's median and minimum milliseconds
+and its threshold from bench_thresholds.json; a case over its threshold, or
+slower than BASELINE_TOLERANCE x its median in an earlier results file, fails
+the run.
+
+    python bench.py [results.json] [baseline.json]
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import UTC, datetime
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+ML_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "ml")
+MODEL_FILE = os.path.join(ML_DIR, "model.ubj")
+LAND_COVER_FILE = os.path.join(BACKEND_DIR, "land_cover.csv")
+THRESHOLDS_FILE = os.path.join(BACKEND_DIR, "bench_thresholds.json")
+RESULTS_FILE = "bench_results.json"
+
+REPEATS = int(os.environ.get("FIRESPOT_BENCH_REPEATS", "5"))
+COLD_REPEATS = int(os.environ.get("FIRESPOT_BENCH_COLD_REPEATS", "3"))
+BASELINE_TOLERANCE = float(os.environ.get("FIRESPOT_BENCH_TOLERANCE", "1.25"))
+
+MAP_SIDES = [5, 21, 51, 101, 201]
+MAP_FORMATS = ["kml", "json"]
+BATCH_SIZES = [1, 100, 1000, 10000, 100000]
+MAP_CENTER = (37.3, -121.9)
+SEED = 0
+
+# read when the app is imported
+os.environ.setdefault("FIRESPOT_RISK_RASTER", "0")
+
+
+def timed(fn, repeats=REPEATS):
+    """Milliseconds of each of `repeats` calls of fn(i)."""
+    runs = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        fn(i)
+        runs.append((time.perf_counter() - start) * 1000)
+    return runs
+
+
+def serving_app():
+    """The Flask test client, its registry pointed at the committed model."""
+    from firespot_shared.features import BASE_FEATURES
+
+    from main import app
+    from registry import registry
+
+    registry.model_file = MODEL_FILE
+    # no compiled model or feature store, so the .ubj and the CSV are used
+    registry.compiled_model_file = ""
+    registry.feature_store_file = ""
+    registry.land_cover_file = LAND_COVER_FILE
+    registry.feature_names = BASE_FEATURES
+    registry.check_interval = 0
+    registry.reload(force=True)
+    return app.test_client()
+
+
+def get_map(client, center, side=5, fmt="kml"):
+    step = 0.05
+    radius = (side - 1) / 2 * step
+    response = client.get(
+        f"/get-map?latitude={center[0]}&longitude={center[1]}"
+        f"&radius={radius}&step={step}&format={fmt}"
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"/get-map returned {response.status_code}")
+    return response
+
+
+def shifted(i):
+    """A center i + 1 cells north of MAP_CENTER, so each run misses the cache."""
+    return (round(MAP_CENTER[0] + 0.1 * (i + 1), 2), MAP_CENTER[1])
+
+
+def bench_loading(cases):
+    from firespot_shared.grid import LandCoverGrid
+    from firespot_shared.store import FeatureStore, layers_from_csv, write_store
+    from firespot_shared.treeeval import compile_model
+
+    from registry import load_model
+
+    cases["load.model_ubj"] = timed(lambda i: load_model(MODEL_FILE))
+    cases["load.land_cover_csv"] = timed(
+        lambda i: LandCoverGrid.from_csv(LAND_COVER_FILE)
+    )
+    with tempfile.TemporaryDirectory(prefix="firespot-bench-") as tmp:
+        npz = os.path.join(tmp, "model.npz")
+        compile_model(MODEL_FILE, npz)
+        cases["load.model_npz"] = timed(lambda i: load_model(npz))
+        store_path = os.path.join(tmp, "features.bin")
+        write_store(store_path, layers_from_csv(LAND_COVER_FILE))
+        cases["load.feature_store"] = timed(
+            lambda i: FeatureStore(store_path).land_cover()
+        )
+
+
+def bench_serving(cases):
+    client = serving_app()
+    for fmt in MAP_FORMATS:
+        for side in MAP_SIDES:
+            cases[f"get_map.{fmt}.{side}x{side}"] = timed(
+                lambda i: get_map(client, shifted(i), side, fmt)
+            )
+
+    get_map(client, MAP_CENTER)
+    cases["get_map.cached.5x5"] = timed(lambda i: get_map(client, MAP_CENTER))
+
+    rng = np.random.default_rng(SEED)
+    for n in BATCH_SIZES:
+        lats = rng.uniform(32.5, 42.0, n)
+        lons = rng.uniform(-124.4, -114.1, n)
+        body = "latitude,longitude\n" + "".join(
+            f"{lat:.4f},{lon:.4f}\n" for lat, lon in zip(lats, lons)
+        )
+
+        def post(i, body=body):
+            response = client.post(
+                "/predict-batch",
+                data=body,
+                content_type="text/csv",
+                headers={"Accept": "text/csv"},
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f"/predict-batch returned {response.status_code}")
+
+        cases[f"predict_batch.{n}"] = timed(post)
+
+
+def child(command):
+    """Run `python bench.py <command>` and return the milliseconds it prints."""
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), command],
+        cwd=BACKEND_DIR,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def cold_get_map():
+    start = time.perf_counter()
+    client = serving_app()
+    get_map(client, MAP_CENTER)
+    print(json.dumps([(time.perf_counter() - start) * 1000]))
+
+
+def ml_predict():
+    os.chdir(ML_DIR)
+    sys.path.insert(0, ML_DIR)
+    from predict import predict
+
+    print(json.dumps(timed(lambda i: predict(*MAP_CENTER))))
+
+
+def check(cases, thresholds, baseline):
+    results, failed = {}, []
+    for name, runs in cases.items():
+        median = statistics.median(runs)
+        result = {
+            "median_ms": round(median, 3),
+            "min_ms": round(min(runs), 3),
+            "runs": len(runs),
+            "threshold_ms": thresholds.get(name),
+        }
+        problems = []
+        if result["threshold_ms"] is not None and median > result["threshold_ms"]:
+            problems.append(f"over its {result['threshold_ms']} ms threshold")
+        before = baseline.get(name)
+        if before is not None:
+            result["baseline_ms"] = before["median_ms"]
+            if median > before["median_ms"] * BASELINE_TOLERANCE:
+                problems.append(
+                    f"{median / before['median_ms']:.2f}x the baseline median"
+                )
+        result["ok"] = not problems
+        if problems:
+            failed.append(f"{name}: {median:.1f} ms, {' and '.join(problems)}")
+        results[name] = result
+    return results, failed
+
+
+def main():
+    if len(sys.argv) > 3:
+        print("Usage: python bench.py [results.json] [baseline.json]")
+        sys.exit(1)
+    out_path = sys.argv[1] if len(sys.argv) > 1 else RESULTS_FILE
+    baseline = {}
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    with open(THRESHOLDS_FILE, encoding="utf-8") as f:
+        thresholds = json.load(f)
+
+    cases = {}
+    print("Loading...")
+    bench_loading(cases)
+    print("Cold starts...")
+    cases["cold.get_map"] = [child("cold-get-map")[0] for _ in range(COLD_REPEATS)]
+    print("Serving...")
+    bench_serving(cases)
+    print("ml/predict.py...")
+    cases["ml.predict"] = child("ml-predict")
+
+    results, failed = check(cases, thresholds, baseline)
+    report = {
+        "created": datetime.now(UTC).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeats": REPEATS,
+        "results": results,
+    }
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'Case':<26} {'Median ms':>10} {'Min ms':>10} {'Limit ms':>10}")
+    for name, r in results.items():
+        limit = "" if r["threshold_ms"] is None else f"{r['threshold_ms']:,.0f}"
+        flag = "" if r["ok"] else "  FAIL"
+        print(
+            f"{name:<26} {r['median_ms']:>10,.1f} {r['min_ms']:>10,.1f} "
+            f"{limit:>10}{flag}"
+        )
+    print(f"\nResults written to: {out_path}")
+    if failed:
+        print("Regressions:\n  " + "\n  ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["cold-get-map"]:
+        cold_get_map()
+    elif sys.argv[1:] == ["ml-predict"]:
+        ml_predict()
+    else:
+        main()
@@ -0,0 +1,209 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+CACHE_BYTES = int(os.environ.get("FIRESPOT_CACHE_BYTES", str(64 * 1024 * 1024)))
+# optional directory shared by all workers, e.g. /dev/shm/firespot
+CACHE_DIR = os.environ.get("FIRESPOT_CACHE_DIR", "")
+CACHE_DIR_BYTES = int(
+    os.environ.get("FIRESPOT_CACHE_DIR_BYTES", str(512 * 1024 * 1024))
+)
+
+
+def next_midnight(now=None):
+    """Epoch seconds of the next local day boundary."""
+    now = now or datetime.now()
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return tomorrow.timestamp()
+
+
+def cache_key(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class LRUCache:
+    """In-process LRU of bytes values bounded by total size, with expiry times."""
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.stats = CacheStats()
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            value, expires_at = entry
+            if time.time() >= expires_at:
+                self._drop(key)
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def put(self, key, value, expires_at):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, expires_at)
+            self.nbytes += len(value)
+            while self.nbytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.stats.evictions += 1
+
+    def _drop(self, key):
+        value, _ = self._entries.pop(key)
+        self.nbytes -= len(value)
+
+
+class FileCache:
+    """
+    Cache entries as files in a directory shared between workers. Point it
+    at /dev/shm to keep it in shared memory. The expiry time is the file's
+    mtime; writes go through a temp file and rename.
+    """
+
+    def __init__(self, directory, max_bytes=CACHE_DIR_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return None if entry is None else entry[0]
+
+    def get_entry(self, key):
+        """Return (value, expires_at) or None."""
+        path = self._path(key)
+        try:
+            expires_at = os.path.getmtime(path)
+            if expires_at <= time.time():
+                os.remove(path)
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            with open(path, "rb") as f:
+                value = f.read()
+        except OSError:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return value, expires_at
+
+    def put(self, key, value, expires_at):
+        path = self._path(key)
+        tmp = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(value)
+            os.utime(tmp, (time.time(), expires_at))
+            os.replace(tmp, path)
+        except OSError:
+            return
+        self._writes += 1
+        if self._writes % 256 == 0:
+            self.prune()
+
+    def prune(self):
+        """Drop expired files, then the least recently written until under budget."""
+        now = time.time()
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            if ".tmp" in entry.name:
+                continue
+            if st.st_mtime <= now:
+                self._remove(entry.path)
+                self.stats.expirations += 1
+                continue
+            entries.append((st.st_ctime, st.st_size, entry.path))
+            total += st.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            self.stats.evictions += 1
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class ResponseCache:
+    """The per-process LRU, backed by a shared FileCache when configured."""
+
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            entry = self.shared.get_entry(key)
+            if entry is not None:
+                value = entry[0]
+                self.local.put(key, *entry)
+        return value
+
+    def put(self, key, value, expires_at):
+        self.local.put(key, value, expires_at)
+        if self.shared is not None:
+            self.shared.put(key, value, expires_at)
+
+    def stats(self):
+        stats = {
+            "local": {
+                **self.local.stats.as_dict(),
+                "entries": len(self.local),
+                "bytes": self.local.nbytes,
+            }
+        }
+        if self.shared is not None:
+            stats["shared"] = self.shared.stats.as_dict()
+        return stats
+
+
+response_cache = ResponseCache(LRUCache(), FileCache(CACHE_DIR) if CACHE_DIR else None)
@@ -0,0 +1,9 @@
+import pytest
+
+import bench
+
+
+@pytest.fixture(scope="session")
+def client():
+    """Flask test client serving the committed ml/model.ubj, no risk raster."""
+    return bench.serving_app()
@@ -0,0 +1,77 @@
+import json
+
+import numpy as np
+import simplekml
+
+# /get-map response formats: name -> content type. KML stays the default.
+CONTENT_TYPES = {
+    "kml": "application/xml",
+    "json": "application/json",
+    "geojson": "application/geo+json",
+    "bin": "application/octet-stream",
+}
+MIMETYPE_FORMATS = {
+    "application/xml": "kml",
+    "application/vnd.google-earth.kml+xml": "kml",
+    "application/json": "json",
+    "application/geo+json": "geojson",
+    "application/octet-stream": "bin",
+}
+
+
+def negotiate(format_arg, accept):
+    """
+    Pick a response format from an explicit ?format= value, else the Accept
+    header (a werkzeug MIMEAccept). Returns None for an unknown ?format=.
+    """
+    if format_arg is not None:
+        return format_arg if format_arg in CONTENT_TYPES else None
+    best = accept.best_match(list(MIMETYPE_FORMATS))
+    return MIMETYPE_FORMATS.get(best, "kml")
+
+
+def to_kml(lats, lons, probs):
+    kml = simplekml.Kml()
+    for slat, slon, prob in zip(lats.tolist(), lons.tolist(), probs.tolist()):
+        kml.newpoint(
+            name=f"{slat},{slon}", coords=[(slat, slon)], description=str(prob)
+        )
+    return kml.kml()
+
+
+def to_json(lats, lons, probs):
+    # [[lat, lon, prob], ...]
+    rows = np.column_stack([lats, lons, probs]).tolist()
+    return json.dumps(rows, separators=(",", ":"))
+
+
+def to_geojson(lats, lons, probs):
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [slon, slat]},
+            "properties": {"prob": prob},
+        }
+        for slat, slon, prob in zip(lats.tolist(), lons.tolist(), probs.tolist())
+    ]
+    return json.dumps(
+        {"type": "FeatureCollection", "features": features}, separators=(",", ":")
+    )
+
+
+def to_bin(lats, lons, probs):
+    # little-endian float32 (lat, lon, prob) triples, 12 bytes per point
+    return np.column_stack([lats, lons, probs]).astype("<f4").tobytes()
+
+
+SERIALIZERS = {
+    "kml": to_kml,
+    "json": to_json,
+    "geojson": to_geojson,
+    "bin": to_bin,
+}
+
+
+def render(fmt, lats, lons, probs):
+    """Return (body, content type) for one of the /get-map formats."""
+    return SERIALIZERS[fmt](lats, lons, probs), CONTENT_TYPES[fmt]
@@ -0,0 +1,71 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+INFERENCE_WORKERS = int(
+    os.environ.get("FIRESPOT_INFERENCE_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+# jobs running or waiting before new ones are turned away with a 503
+INFERENCE_QUEUE = int(os.environ.get("FIRESPOT_INFERENCE_QUEUE", "64"))
+RETRY_AFTER = int(os.environ.get("FIRESPOT_RETRY_AFTER", "1"))
+
+
+class Overloaded(Exception):
+    """Raised when the inference queue is full."""
+
+
+class InferencePool:
+    """
+    Bounded thread pool for model work, shared by the WSGI and ASGI apps.
+
+    Jobs submitted under the same key while one is in flight share its
+    Future ("single-flight"), so a burst of requests for the same map runs
+    the model once. A keyless job is never coalesced.
+    """
+
+    def __init__(self, workers=INFERENCE_WORKERS, max_pending=INFERENCE_QUEUE):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="inference"
+        )
+        self._inflight = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.coalesced = 0
+        self.rejected = 0
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def submit(self, key, fn, *args):
+        with self._lock:
+            if key is not None and key in self._inflight:
+                self.coalesced += 1
+                return self._inflight[key]
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise Overloaded()
+            self._pending += 1
+            future = self._executor.submit(fn, *args)
+            if key is not None:
+                self._inflight[key] = future
+        future.add_done_callback(lambda _: self._done(key))
+        return future
+
+    def _done(self, key):
+        with self._lock:
+            self._pending -= 1
+            if key is not None:
+                self._inflight.pop(key, None)
+
+    def stats(self):
+        return {
+            "pending": self._pending,
+            "inflight_keys": len(self._inflight),
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+        }
+
+
+inference_pool = InferencePool()
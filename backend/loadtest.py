@@ -0,0 +1,348 @@
+"""
+Load generator that replays the frontend's traffic against a running backend.
+
+frontend/src/App.svelte asks for a /get-map around the browser's location on
+page load, then one more per address search, each after a Nominatim lookup.
+Every simulated user here runs such sessions back to back: a page-load map
+near a populated place, then a geometric number of searches (mean SEARCHES)
+that each go through the Nominatim stand-in and, when it finds the address,
+request the map there. Locations come from PLACES weighted by population, or
+from a recorded latitude,longitude CSV.
+
+The Nominatim stand-in is an HTTP server on localhost that resolves
+"<number> <street>, <place>" to a fixed point near the place, so the run
+needs no network. Throughput, latency percentiles and error rates are
+reported per request kind.
+
+    python loadtest.py [backend_url] [coords.csv]
+
+with the backend started separately, e.g. `uvicorn asgi:app --workers 4`.
+"""
+
+import csv
+import hashlib
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+import numpy as np
+
+BACKEND_URL = "http://127.0.0.1:5000"
+# simulated users, each running one session at a time
+CONCURRENCY = int(os.environ.get("FIRESPOT_LOAD_CONCURRENCY", "8"))
+DURATION = float(os.environ.get("FIRESPOT_LOAD_SECONDS", "30"))
+SEARCHES = float(os.environ.get("FIRESPOT_LOAD_SEARCHES", "2"))
+THINK_MS = float(os.environ.get("FIRESPOT_LOAD_THINK_MS", "0"))
+NOMINATIM_MS = float(os.environ.get("FIRESPOT_LOAD_NOMINATIM_MS", "100"))
+# share of searches for an address the stand-in does not know
+NOT_FOUND_RATE = float(os.environ.get("FIRESPOT_LOAD_NOT_FOUND_RATE", "0.05"))
+SEED = int(os.environ.get("FIRESPOT_LOAD_SEED", "0"))
+# JSON copy of the report, if set
+REPORT_FILE = os.environ.get("FIRESPOT_LOAD_REPORT", "")
+TIMEOUT = 60
+
+# (name, lat, lon, metro population in millions, spread in degrees)
+PLACES = [
+    ("New York", 40.71, -74.01, 19.5, 0.3),
+    ("Los Angeles", 34.05, -118.24, 13.0, 0.4),
+    ("Chicago", 41.88, -87.63, 9.4, 0.3),
+    ("Dallas", 32.78, -96.80, 7.6, 0.3),
+    ("Houston", 29.76, -95.37, 7.1, 0.3),
+    ("Washington", 38.91, -77.04, 6.3, 0.25),
+    ("Philadelphia", 39.95, -75.17, 6.2, 0.25),
+    ("Miami", 25.76, -80.19, 6.1, 0.2),
+    ("Atlanta", 33.75, -84.39, 6.1, 0.3),
+    ("Boston", 42.36, -71.06, 4.9, 0.25),
+    ("Phoenix", 33.45, -112.07, 4.9, 0.3),
+    ("San Francisco", 37.77, -122.42, 4.6, 0.25),
+    ("Riverside", 33.95, -117.40, 4.6, 0.3),
+    ("Detroit", 42.33, -83.05, 4.3, 0.25),
+    ("Seattle", 47.61, -122.33, 4.0, 0.25),
+    ("Minneapolis", 44.98, -93.27, 3.7, 0.25),
+    ("San Diego", 32.72, -117.16, 3.3, 0.2),
+    ("Tampa", 27.95, -82.46, 3.2, 0.2),
+    ("Denver", 39.74, -104.99, 3.0, 0.2),
+    ("Portland", 45.52, -122.68, 2.5, 0.2),
+    ("Sacramento", 38.58, -121.49, 2.4, 0.2),
+    ("Las Vegas", 36.17, -115.14, 2.3, 0.15),
+    ("San Jose", 37.34, -121.89, 2.0, 0.15),
+    ("Salt Lake City", 40.76, -111.89, 1.3, 0.15),
+    ("Fresno", 36.74, -119.79, 1.0, 0.15),
+    ("Boise", 43.62, -116.20, 0.8, 0.1),
+    ("Reno", 39.53, -119.81, 0.5, 0.1),
+    ("Redding", 40.59, -122.39, 0.2, 0.1),
+]
+STREETS = ["Main St", "Oak Ave", "Pine St", "Maple Dr", "Cedar Ln", "Park Blvd"]
+
+
+class Gazetteer:
+    """Places the stand-in resolves, and where simulated users are."""
+
+    def __init__(self, places):
+        self.names = [p[0] for p in places]
+        self.lats = np.array([p[1] for p in places])
+        self.lons = np.array([p[2] for p in places])
+        weights = np.array([p[3] for p in places], dtype=np.float64)
+        self.weights = weights / weights.sum()
+        self.spreads = np.array([p[4] for p in places])
+        self.index = {name.lower(): i for i, name in enumerate(self.names)}
+
+    @classmethod
+    def from_csv(cls, path):
+        """One place per recorded point, equally likely and without spread."""
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        return cls(
+            [
+                (f"Point {i}", float(r["latitude"]), float(r["longitude"]), 1.0, 0.0)
+                for i, r in enumerate(rows)
+            ]
+        )
+
+    def locate(self, rng):
+        """A browser location: a place drawn by weight, spread around it."""
+        i = rng.choice(len(self.names), p=self.weights)
+        return (
+            float(self.lats[i] + rng.normal(0, self.spreads[i] / 2 + 1e-9)),
+            float(self.lons[i] + rng.normal(0, self.spreads[i] / 2 + 1e-9)),
+        )
+
+    def address(self, rng):
+        i = rng.choice(len(self.names), p=self.weights)
+        place = self.names[i]
+        if rng.random() < NOT_FOUND_RATE:
+            place += "ville"
+        return f"{rng.integers(1, 10000)} {rng.choice(STREETS)}, {place}"
+
+    def resolve(self, query):
+        """(lat, lon) of an address, the same every time, or None."""
+        place = query.rpartition(",")[2].strip().lower()
+        i = self.index.get(place)
+        if i is None:
+            return None
+        digest = hashlib.sha256(query.encode("utf-8")).digest()
+        u, v = np.frombuffer(digest[:16], dtype=np.uint64) / float(2**64)
+        spread = self.spreads[i]
+        return self.lats[i] + (u - 0.5) * spread, self.lons[i] + (v - 0.5) * spread
+
+
+def nominatim_stub(gazetteer, delay_ms=NOMINATIM_MS):
+    """A running localhost server answering /search like Nominatim's JSON API."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real service
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path != "/search":
+                self.send_error(404)
+                return
+            query = parse_qs(url.query).get("q", [""])[0]
+            found = gazetteer.resolve(query)
+            results = []
+            if found is not None:
+                results.append(
+                    {
+                        "lat": f"{found[0]:.7f}",
+                        "lon": f"{found[1]:.7f}",
+                        "display_name": query,
+                    }
+                )
+            time.sleep(delay_ms / 1000)
+            body = json.dumps(results).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Client:
+    """One keep-alive connection per host, as a browser tab would hold."""
+
+    def __init__(self):
+        self._connections = {}
+
+    def get(self, url):
+        """(status, body) of a GET; reconnects once if the server closed."""
+        parts = urlsplit(url)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        for attempt in range(2):
+            conn = self._connection(parts)
+            try:
+                conn.request("GET", path, headers={"Accept-Language": "en"})
+                response = conn.getresponse()
+                return response.status, response.read()
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                del self._connections[parts.netloc]
+                # only a kept-alive connection the server dropped is retried
+                if attempt or not isinstance(e, ConnectionError):
+                    raise
+
+    def _connection(self, parts):
+        if parts.netloc not in self._connections:
+            cls = (
+                http.client.HTTPSConnection
+                if parts.scheme == "https"
+                else http.client.HTTPConnection
+            )
+            self._connections[parts.netloc] = cls(parts.netloc, timeout=TIMEOUT)
+        return self._connections[parts.netloc]
+
+    def close(self):
+        for conn in self._connections.values():
+            conn.close()
+
+
+class User:
+    """A simulated visitor; records (kind, status, milliseconds) per request."""
+
+    def __init__(self, backend_url, nominatim_url, gazetteer, rng):
+        self.backend_url = backend_url.rstrip("/")
+        self.nominatim_url = nominatim_url
+        self.gazetteer = gazetteer
+        self.rng = rng
+        self.client = Client()
+        self.records = []
+        self.sessions = 0
+
+    def fetch(self, kind, url):
+        start = time.perf_counter()
+        try:
+            status, body = self.client.get(url)
+        except (OSError, http.client.HTTPException) as e:
+            status, body = type(e).__name__, b""
+        self.records.append((kind, status, (time.perf_counter() - start) * 1000))
+        return status, body
+
+    def get_map(self, kind, lat, lon):
+        # the frontend sends the coordinates unrounded
+        self.fetch(
+            kind,
+            f"{self.backend_url}/get-map?latitude={lat}&longitude={lon}&format=json",
+        )
+
+    def session(self):
+        self.get_map("get-map (page load)", *self.gazetteer.locate(self.rng))
+        for _ in range(self.rng.geometric(1 / (1 + SEARCHES)) - 1):
+            if THINK_MS:
+                time.sleep(self.rng.exponential(THINK_MS) / 1000)
+            query = quote(self.gazetteer.address(self.rng))
+            status, body = self.fetch(
+                "nominatim",
+                f"{self.nominatim_url}/search?q={query}&format=json&limit=1",
+            )
+            results = json.loads(body) if status == 200 else []
+            if results:
+                lat, lon = float(results[0]["lat"]), float(results[0]["lon"])
+                self.get_map("get-map (search)", lat, lon)
+        self.sessions += 1
+
+    def run(self, deadline):
+        while time.monotonic() < deadline:
+            self.session()
+        self.client.close()
+        return self
+
+
+def summarize(records, seconds):
+    """Counts, throughput, error rate and latency percentiles for records."""
+    ms = np.array([r[2] for r in records])
+    statuses = Counter(str(r[1]) for r in records)
+    errors = sum(n for status, n in statuses.items() if status != "200")
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99]) if len(ms) else (0, 0, 0)
+    return {
+        "requests": len(records),
+        "per_second": len(records) / seconds,
+        "error_rate": errors / len(records) if records else 0.0,
+        "statuses": dict(statuses),
+        "p50_ms": float(p50),
+        "p90_ms": float(p90),
+        "p99_ms": float(p99),
+        "max_ms": float(ms.max()) if len(ms) else 0.0,
+    }
+
+
+def main():
+    if len(sys.argv) > 3:
+        print("Usage: python loadtest.py [backend_url] [coords.csv]")
+        sys.exit(1)
+    backend_url = sys.argv[1] if len(sys.argv) > 1 else BACKEND_URL
+    if len(sys.argv) > 2:
+        gazetteer = Gazetteer.from_csv(sys.argv[2])
+    else:
+        gazetteer = Gazetteer(PLACES)
+
+    stub = nominatim_stub(gazetteer)
+    nominatim_url = f"http://127.0.0.1:{stub.server_address[1]}"
+    print(
+        f"{CONCURRENCY} users for {DURATION:.0f}s against {backend_url} "
+        f"(Nominatim stand-in at {nominatim_url})..."
+    )
+    users = [
+        User(backend_url, nominatim_url, gazetteer, np.random.default_rng([SEED, i]))
+        for i in range(CONCURRENCY)
+    ]
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        list(pool.map(lambda user: user.run(start + DURATION), users))
+    seconds = time.monotonic() - start
+    stub.shutdown()
+
+    records = [record for user in users for record in user.records]
+    kinds = sorted({r[0] for r in records})
+    report = {
+        "backend": backend_url,
+        "concurrency": CONCURRENCY,
+        "seconds": seconds,
+        "sessions": sum(user.sessions for user in users),
+        "requests": {
+            **{
+                kind: summarize([r for r in records if r[0] == kind], seconds)
+                for kind in kinds
+            },
+            "all": summarize(records, seconds),
+        },
+    }
+
+    print(f"\n{report['sessions']:,} sessions in {seconds:.1f}s")
+    print(
+        f"{'Requests':<22} {'Count':>7} {'Per s':>7} {'Errors':>7} "
+        f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'Max ms':>8}"
+    )
+    for kind in kinds + ["all"]:
+        s = report["requests"][kind]
+        print(
+            f"{kind:<22} {s['requests']:>7,} {s['per_second']:>7.1f} "
+            f"{s['error_rate']:>7.1%} {s['p50_ms']:>8.1f} {s['p90_ms']:>8.1f} "
+            f"{s['p99_ms']:>8.1f} {s['max_ms']:>8.1f}"
+        )
+    all_statuses = report["requests"]["all"]["statuses"]
+    failures = {k: v for k, v in all_statuses.items() if k != "200"}
+    if failures:
+        print(f"Non-200 responses: {failures}")
+    if REPORT_FILE:
+        with open(REPORT_FILE, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to: {REPORT_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,38 @@
-import csv
-import math
+import time
 from datetime import datetime
 
 import numpy as np
-import simplekml
-import xgboost as xgb
-from flask import Flask, make_response, request
+from firespot_shared.grid import cell_index
+from flask import Flask, Response, g, make_response, request
 from flask_cors import CORS
+from werkzeug.http import http_date
+
+from batch import parse_points, stream_csv, stream_ndjson
+from cache import cache_key, next_midnight, response_cache
+from formats import CONTENT_TYPES, negotiate, render
+from inference import RETRY_AFTER, Overloaded, inference_pool
+from metrics import (
+    CONTENT_TYPE,
+    REQUEST_SECONDS,
+    STAGE_SECONDS,
+    metric,
+    stage,
+    traced,
+)
+from registry import MODEL_RETRY_SECONDS, ModelUnavailable, registry
+from risk import RISK_ENABLED, model_inputs, rasters
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
 GRID_RES = 0.1
 RATE_SCALE = 0.060
 non_burnable = [11, 12, 31, 250]
+YEARS = 5
+
+# default map: 5x5 points ~5 km apart around the user
+MAP_RADIUS = 0.1
+MAP_STEP = 0.05
+MAX_MAP_SIDE = 201
 
 
 def snap(lat, lon):
@@ -22,15 +42,113 @@ def snap(lat, lon):
     )
 
 
-def load_land_cover():
-    land_cover = {}
-    with open("land_cover.csv", newline="") as f:
-        for row in csv.DictReader(f):
-            lat = float(row["lat_cell"])
-            lon = float(row["lon_cell"])
-            lc = int(row["land_cover"])
-            land_cover[(lat, lon)] = lc
-    return land_cover
+def neighborhood_cells(latitude, longitude, radius=MAP_RADIUS, step=MAP_STEP):
+    """
+    Integer cell numbers along each axis for a square of points `step`
+    apart reaching `radius` degrees from the center.
+    """
+    n = int(round(radius / step))
+    offsets = np.arange(-n, n + 1) * step
+    return (
+        cell_index(latitude + offsets, GRID_RES),
+        cell_index(longitude + offsets, GRID_RES),
+    )
+
+
+def neighborhood(lat_cells, lon_cells):
+    """Snapped (lat, lon) arrays, row-major from the south-west corner."""
+    lat_cells, lon_cells = np.meshgrid(lat_cells, lon_cells, indexing="ij")
+    lats = np.round(lat_cells.ravel() * GRID_RES, 6)
+    lons = np.round(lon_cells.ravel() * GRID_RES, 6)
+    return lats, lons
+
+
+def fire_probability(rate, land_cover, years=YEARS):
+    # use fire rate in poisson distribution (intensity = 1-e^(-k))
+    # k = rate * years
+    rate = np.asarray(rate, dtype=np.float64)
+    prob = np.round(1 - np.exp(-rate * RATE_SCALE * years), 3)
+    return np.where(np.isin(land_cover, non_burnable), 0.0, prob)
+
+
+def fire_rate(snapshot, day, lats, lons, land_cover):
+    """Model fire rate per point, read from the day's risk raster when built."""
+    pred = np.empty(len(lats), dtype=np.float32)
+    live = np.ones(len(lats), dtype=bool)
+
+    if RISK_ENABLED:
+        with stage("raster"):
+            raster = rasters.get(snapshot, day)
+            if raster is not None:
+                rows, cols, inside = snapshot.land_cover.grid.index(lats, lons)
+                pred[inside] = raster[rows[inside], cols[inside]]
+                live = ~inside
+
+    if live.any():
+        # infer to get fire rate
+        with stage("features"):
+            x_infer = model_inputs(
+                snapshot, lats[live], lons[live], land_cover[live], day
+            )
+        with stage("predict"):
+            pred[live] = snapshot.model.predict(x_infer)
+    return pred
+
+
+def score_points(snapshot, day, lats, lons, years):
+    """
+    Per-point (fire_rate, prob) for arbitrary coordinates, matching
+    ml/predict.py: rates are clipped at 0 and non-burnable cells are 0/0.
+    The model runs once per distinct snapped cell.
+    """
+    with traced("/predict-batch"):
+        with stage("land_cover"):
+            rows = cell_index(lats, GRID_RES)
+            cols = cell_index(lons, GRID_RES)
+            # one int64 key per cell; the column offset keeps the remainder positive
+            keys = rows * 100_000 + (cols + 50_000)
+            cells, inverse = np.unique(keys, return_inverse=True)
+            cell_rows = cells // 100_000
+            cell_cols = cells % 100_000 - 50_000
+            cell_lats = np.round(cell_rows * GRID_RES, 6)
+            cell_lons = np.round(cell_cols * GRID_RES, 6)
+            land_cover = snapshot.land_cover.lookup(cell_lats, cell_lons, 250)
+
+        rate = fire_rate(snapshot, day, cell_lats, cell_lons, land_cover)
+        with stage("probability"):
+            rate = np.clip(rate, 0, None).astype(np.float64)
+            rate[np.isin(land_cover, non_burnable)] = 0.0
+            fire_rates = rate[inverse.ravel()]
+            probs = 1.0 - np.exp(-fire_rates * RATE_SCALE * years)
+    return fire_rates, probs
+
+
+def cache_headers(key, snapshot, expires_at):
+    """
+    Validators for a /get-map response: the cache key doubles as a strong
+    ETag, and browsers/CDNs may reuse the body until the next midnight.
+    """
+    now = time.time()
+    day_start = expires_at - 86400
+    return {
+        "ETag": f'"{key}"',
+        "Last-Modified": http_date(max(snapshot.modified_at, day_start)),
+        "Cache-Control": f"public, max-age={max(0, int(expires_at - now))}",
+        "Vary": "Accept",
+    }
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_time(response):
+    # the route pattern, so unknown paths share one series
+    route = request.url_rule.rule if request.url_rule is not None else "other"
+    REQUEST_SECONDS.observe(route, time.perf_counter() - g.request_start)
+    return response
 
 
 @app.route("/")
@@ -38,63 +156,208 @@ def hello_world():
     return "<p>Hello, World!</p>"
 
 
-@app.route("/get-map", methods=["GET"])
-def get_map():
-    latitude = request.args.get("latitude")
-    longitude = request.args.get("longitude")
+class MapJob:
+    """A /get-map request that missed the response cache."""
+
+    def __init__(self, key, headers, expires_at, snapshot, day, cells, fmt):
+        self.key = key
+        self.headers = headers
+        self.snapshot = snapshot
+        self.day = day
+        self.lat_cells, self.lon_cells = cells
+        self.fmt = fmt
+        self.expires_at = expires_at
+
+    def run(self):
+        with traced("/get-map"):
+            with stage("land_cover"):
+                lats, lons = neighborhood(self.lat_cells, self.lon_cells)
+                land_cover = self.snapshot.land_cover.lookup(lats, lons, 250)
+            pred = fire_rate(self.snapshot, self.day, lats, lons, land_cover)
+            with stage("probability"):
+                probs = fire_probability(pred, land_cover)
+            with stage("render"):
+                body, _ = render(self.fmt, lats, lons, probs)
+                if isinstance(body, str):
+                    body = body.encode("utf-8")
+        response_cache.put(self.key, body, self.expires_at)
+        return body
+
+
+def plan_map(args, accept_mimetypes, if_none_match):
+    """
+    Everything /get-map does short of inference, shared by the Flask view
+    and the ASGI app. Returns (body, status, headers) when the response is
+    already known (bad input, 304, cache hit), else a MapJob to run.
+    """
+    latitude = args.get("latitude")
+    longitude = args.get("longitude")
 
     if latitude is None or longitude is None:
-        return "Missing query parameters", 400
+        return "Missing query parameters", 400, {}
 
     try:
         latitude = round(float(latitude), 2)
         longitude = round(float(longitude), 2)
+        radius = float(args.get("radius", MAP_RADIUS))
+        step = float(args.get("step", MAP_STEP))
     except ValueError:
-        return "Invalid query parameters", 400
+        return "Invalid query parameters", 400, {}
 
-    kml = simplekml.Kml()
+    if not np.isfinite([latitude, longitude, radius, step]).all():
+        return "Invalid query parameters", 400, {}
 
-    # kml.newpoint(name="dummy", coords=[(37.3483333333, -121.9353888889)], description="0.5")
+    if not (0 <= radius and 0 < step and 2 * radius / step + 1 <= MAX_MAP_SIDE):
+        return "Invalid query parameters", 400, {}
 
-    lat, lon = latitude - 0.1, longitude - 0.1
+    fmt = negotiate(args.get("format"), accept_mimetypes)
+    if fmt is None:
+        return "Invalid query parameters", 400, {}
 
-    model = xgb.XGBRegressor()
-    model.load_model("model2.ubj")
+    snapshot = registry.get()
+    day = datetime.now().date()
+    lat_cells, lon_cells = neighborhood_cells(latitude, longitude, radius, step)
 
-    coordinates = []
-    dt = datetime.now()
-    land_cover = load_land_cover()
+    # the map depends only on the snapped cells, the day and the model
+    key = cache_key(
+        lat_cells.tobytes(), lon_cells.tobytes(), day, snapshot.version, fmt
+    )
+    expires_at = next_midnight()
+    headers = cache_headers(key, snapshot, expires_at)
+    if if_none_match.contains_weak(key):
+        return "", 304, headers
 
-    while lat <= latitude + 0.1:
-        while lon <= longitude + 0.1:
-            slat, slon = snap(lat, lon)
-            coordinates.append(
-                [
-                    slat,
-                    slon,
-                    dt.month,
-                    int(dt.strftime("%j")),
-                    land_cover.get((slat, slon), 250),
-                ]
-            )
-            print(coordinates[-1])
-            lon += 0.05
-        lat += 0.05
-        lon = longitude - 0.1
-
-    # infer to get fire rate
-    x_infer = np.array(coordinates)
-    pred = model.predict(x_infer)
-
-    for i in range(len(pred)):
-        # use fire rate in poisson distribution (intensity = 1-e^(-k))
-        # k = rate * 5 years
-        prob = 0
-        if coordinates[i][4] not in non_burnable:
-            prob = round(1 - math.exp(-pred[i] * RATE_SCALE * 5), 3)
-        slat, slon = coordinates[i][0:2]
-        kml.newpoint(
-            name=f"{slat},{slon}", coords=[(slat, slon)], description=str(prob)
+    headers["Content-Type"] = CONTENT_TYPES[fmt]
+    body = response_cache.get(key)
+    if body is not None:
+        return body, 200, headers
+    cells = (lat_cells, lon_cells)
+    return MapJob(key, headers, expires_at, snapshot, day, cells, fmt)
+
+
+def overloaded():
+    return "Server busy, retry shortly", 503, {"Retry-After": str(RETRY_AFTER)}
+
+
+def unavailable(error):
+    retry_after = str(int(MODEL_RETRY_SECONDS))
+    return f"Model not loaded: {error}", 503, {"Retry-After": retry_after}
+
+
+@app.errorhandler(ModelUnavailable)
+def model_unavailable(error):
+    return make_response(*unavailable(error))
+
+
+@app.route("/get-map", methods=["GET"])
+def get_map():
+    plan = plan_map(request.args, request.accept_mimetypes, request.if_none_match)
+    if not isinstance(plan, MapJob):
+        return make_response(*plan)
+    try:
+        body = inference_pool.submit(plan.key, plan.run).result()
+    except Overloaded:
+        return make_response(*overloaded())
+    return make_response(body, 200, plan.headers)
+
+
+@app.route("/predict-batch", methods=["POST"])
+def predict_batch():
+    try:
+        lats, lons, years = parse_points(request.get_data(), request.content_type or "")
+    except ValueError as e:
+        return f"Invalid request body: {e}", 400
+
+    snapshot = registry.get()
+    try:
+        fire_rates, probs = inference_pool.submit(
+            None, score_points, snapshot, datetime.now().date(), lats, lons, years
+        ).result()
+    except Overloaded:
+        return make_response(*overloaded())
+
+    accept = request.accept_mimetypes.best_match(["application/x-ndjson", "text/csv"])
+    if accept == "text/csv":
+        return Response(stream_csv(lats, lons, fire_rates, probs), mimetype="text/csv")
+    return Response(
+        stream_ndjson(lats, lons, fire_rates, probs), mimetype="application/x-ndjson"
+    )
+
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    return {
+        "cache": response_cache.stats(),
+        "inference": inference_pool.stats(),
+    }
+
+
+def metrics_text():
+    """Prometheus text exposition of this worker's timers and counters."""
+    lines = REQUEST_SECONDS.lines() + STAGE_SECONDS.lines()
+
+    caches = response_cache.stats()
+    for field in ("hits", "misses", "evictions"):
+        lines += metric(
+            "counter",
+            f"firespot_cache_{field}_total",
+            f"Response cache {field}.",
+            [({"cache": cache}, s[field]) for cache, s in caches.items()],
         )
+    lines += metric(
+        "gauge",
+        "firespot_cache_bytes",
+        "Bytes held by the in-process response cache.",
+        [({}, caches["local"]["bytes"])],
+    )
+
+    pool = inference_pool.stats()
+    lines += metric(
+        "gauge",
+        "firespot_inference_pending",
+        "Inference jobs running or queued.",
+        [({}, pool["pending"])],
+    )
+    lines += metric(
+        "counter",
+        "firespot_inference_coalesced_total",
+        "Requests that shared an in-flight job.",
+        [({}, pool["coalesced"])],
+    )
+    lines += metric(
+        "counter",
+        "firespot_inference_rejected_total",
+        "Requests turned away with a 503.",
+        [({}, pool["rejected"])],
+    )
+
+    # a scrape reports the loaded model but never loads one
+    snapshot = registry.peek()
+    if snapshot is not None:
+        lines += metric(
+            "gauge",
+            "firespot_model_info",
+            "The model being served.",
+            [
+                (
+                    {
+                        "version": snapshot.model_version,
+                        "snapshot": snapshot.version,
+                        "path": snapshot.model_stamp[0],
+                    },
+                    1,
+                )
+            ],
+        )
+        lines += metric(
+            "gauge",
+            "firespot_model_loaded_timestamp_seconds",
+            "When the served model was loaded.",
+            [({}, snapshot.loaded_at)],
+        )
+    return "\n".join(lines) + "\n"
+
 
-    return make_response(kml.kml(), 200, {"Content-Type": "application/xml"})
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics_text(), content_type=CONTENT_TYPE)
@@ -0,0 +1,217 @@
+"""
+Per-stage timers, Prometheus text exposition and a sampling profiler.
+
+Request-path code wraps each stage in `with stage("predict"):`, which adds
+its wall time to the firespot_stage_seconds histogram. Work done for one
+request runs under `traced(name)`; with FIRESPOT_PROFILE=1 a background
+thread samples that thread's stack every PROFILE_INTERVAL_MS, and a request
+slower than SLOW_REQUEST_MS has its stacks written to PROFILE_DIR in the
+folded format flamegraph.pl and speedscope read, and its stage times
+printed. Each worker process keeps its own metrics.
+"""
+
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+# seconds
+STAGE_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+PROFILE = os.environ.get("FIRESPOT_PROFILE", "0") == "1"
+PROFILE_INTERVAL_MS = float(os.environ.get("FIRESPOT_PROFILE_INTERVAL_MS", "5"))
+SLOW_REQUEST_MS = float(os.environ.get("FIRESPOT_SLOW_REQUEST_MS", "500"))
+PROFILE_DIR = os.environ.get("FIRESPOT_PROFILE_DIR", "profiles")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _number(value):
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+def metric(kind, name, help_text, samples):
+    """Exposition lines for a counter or gauge: samples are (labels, value)."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines += [f"{name}{_labels(labels)} {_number(value)}" for labels, value in samples]
+    return lines
+
+
+def histogram_lines(name, help_text, series, bounds):
+    """
+    Exposition lines for a histogram. `series` is (labels, per-bucket counts
+    with an overflow slot last, sum); counts are not yet cumulative.
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, counts, total in series:
+        cumulative = 0
+        for bound, n in zip(list(bounds) + [float("inf")], counts):
+            cumulative += n
+            le = {**labels, "le": _number(bound)}
+            lines.append(f"{name}_bucket{_labels(le)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+        lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    return lines
+
+
+class Histogram:
+    """Thread-safe histogram keyed by one label."""
+
+    def __init__(self, name, help_text, label, buckets=STAGE_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._series = {}  # label value -> [counts, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, amount):
+        slot = bisect.bisect_left(self.buckets, amount)
+        with self._lock:
+            series = self._series.get(value)
+            if series is None:
+                series = self._series[value] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][slot] += 1
+            series[1] += amount
+
+    def lines(self):
+        with self._lock:
+            series = [
+                ({self.label: value}, list(counts), total)
+                for value, (counts, total) in sorted(self._series.items())
+            ]
+        return histogram_lines(self.name, self.help_text, series, self.buckets)
+
+
+STAGE_SECONDS = Histogram(
+    "firespot_stage_seconds", "Wall time of each request stage.", "stage"
+)
+REQUEST_SECONDS = Histogram(
+    "firespot_request_seconds", "Wall time of each request by route.", "route"
+)
+
+_trace = threading.local()
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(name, elapsed)
+        stages = getattr(_trace, "stages", None)
+        if stages is not None:
+            stages.append((name, elapsed))
+
+
+class Sampler:
+    """Folded-stack counts for registered threads, sampled on a daemon thread."""
+
+    def __init__(self, interval_ms=PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self._stacks = {}  # thread id -> Counter of folded stacks
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, thread_id):
+        with self._lock:
+            self._stacks[thread_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop, name="profiler", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._stacks.pop(thread_id, Counter())
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, stacks in self._stacks.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[fold(frame)] += 1
+
+
+def fold(frame):
+    """'file:function;...' from the outermost call to `frame`."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+sampler = Sampler()
+
+
+def dump_profile(name, elapsed, stages, stacks, profile_dir=PROFILE_DIR):
+    os.makedirs(profile_dir, exist_ok=True)
+    slug = name.strip("/").replace("/", "_") or "root"
+    path = os.path.join(
+        profile_dir,
+        f"{slug}-{datetime.now():%Y%m%dT%H%M%S%f}-{elapsed * 1000:.0f}ms.folded",
+    )
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    breakdown = ", ".join(f"{s} {t * 1000:.1f}" for s, t in stages)
+    print(f"Slow {name} ({elapsed * 1000:.0f} ms; {breakdown}), stacks in {path}")
+
+
+@contextmanager
+def traced(name):
+    """Profile the current thread's work for one request when PROFILE is on."""
+    if not PROFILE:
+        yield
+        return
+    thread_id = threading.get_ident()
+    _trace.stages = []
+    sampler.start(thread_id)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stacks = sampler.stop(thread_id)
+        stages, _trace.stages = _trace.stages, None
+        if elapsed * 1000 >= SLOW_REQUEST_MS:
+            try:
+                dump_profile(name, elapsed, stages, stacks)
+            except OSError as e:
+                print(f"Could not write profile for {name}: {e}")
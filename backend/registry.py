@@ -0,0 +1,239 @@
+import hashlib
+import io
+import os
+import sys
+import threading
+import time
+
+from firespot_shared.features import FEATURE_NAMES, check_model, check_store
+from firespot_shared.grid import LandCoverGrid
+from firespot_shared.store import open_store
+from firespot_shared.treeeval import CompiledModel
+
+from metrics import stage
+
+MODEL_FILE = os.environ.get("FIRESPOT_MODEL_FILE", "model2.ubj")
+# output of `python -m firespot_shared.treeeval model2.ubj model2.npz`; when
+# present the backend serves from it and never imports xgboost
+COMPILED_MODEL_FILE = os.environ.get("FIRESPOT_COMPILED_MODEL_FILE", "model2.npz")
+# memory-mapped store written by ml/clean_data2.py or
+# `python -m firespot_shared.store`;
+# land_cover.csv and gridmet.csv are only parsed when the store is missing
+FEATURE_STORE_FILE = os.environ.get("FIRESPOT_FEATURE_STORE", "features.bin")
+LAND_COVER_FILE = os.environ.get("FIRESPOT_LAND_COVER_FILE", "land_cover.csv")
+GRIDMET_FILE = os.environ.get("FIRESPOT_GRIDMET_FILE", "gridmet.csv")
+# how often (seconds) a request may stat the model file to pick up a new one
+RELOAD_CHECK_INTERVAL = float(os.environ.get("FIRESPOT_RELOAD_CHECK_INTERVAL", "5"))
+# after a failed first load, requests fail fast for this long before retrying
+MODEL_RETRY_SECONDS = float(os.environ.get("FIRESPOT_MODEL_RETRY_SECONDS", "30"))
+
+
+class ModelUnavailable(Exception):
+    """Raised while no snapshot has loaded yet; the message says why."""
+
+
+def file_stamp(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def load_land_cover(path=LAND_COVER_FILE):
+    return LandCoverGrid.from_csv(path)
+
+
+def load_features(store_path, csv_path, gridmet_path=GRIDMET_FILE):
+    """Return (store, land cover grid, path they came from)."""
+    store = open_store(store_path, csv_path, None, gridmet_path)
+    return store, store.land_cover(), store.path or csv_path
+
+
+def serving_version(model_version, features_stamp):
+    """
+    Version of what a snapshot serves. Rasters, cached maps and ETags are
+    keyed on it, so it changes with the feature files as well as the model.
+    """
+    key = f"{model_version}:{features_stamp!r}".encode("utf-8")
+    return hashlib.sha256(key).hexdigest()[:12]
+
+
+def load_model(path):
+    with open(path, "rb") as f:
+        raw = f.read()
+    version = hashlib.sha256(raw).hexdigest()[:12]
+    if path.endswith(".npz"):
+        return CompiledModel.load(io.BytesIO(raw)), version
+
+    import xgboost as xgb
+
+    model = xgb.XGBRegressor()
+    model.load_model(bytearray(raw))
+    return model, version
+
+
+class Snapshot:
+    """Everything a request needs, loaded together and never mutated."""
+
+    def __init__(
+        self,
+        model,
+        model_version,
+        model_stamp,
+        features,
+        land_cover,
+        features_stamp,
+        feature_names,
+    ):
+        self.model = model
+        self.model_version = model_version
+        self.version = serving_version(model_version, features_stamp)
+        self.model_stamp = model_stamp
+        self.features = features
+        self.land_cover = land_cover
+        self.features_stamp = features_stamp
+        self.feature_names = feature_names
+        # newest mtime (seconds) of the files the snapshot was loaded from
+        self.modified_at = (
+            max(stamp[0] for _, stamp in (model_stamp, *features_stamp)) / 1e9
+        )
+        self.loaded_at = time.time()
+
+
+class ModelRegistry:
+    """
+    Process-wide holder for the model and the grid features.
+
+    Requests call get() and keep the returned snapshot for their whole
+    lifetime. A reload builds a complete new snapshot off to the side and
+    swaps the reference, so in-flight requests finish on the old one. If
+    the first load fails, get() raises ModelUnavailable with the same error
+    for MODEL_RETRY_SECONDS instead of loading again on every request.
+    """
+
+    def __init__(
+        self,
+        model_file=MODEL_FILE,
+        compiled_model_file=COMPILED_MODEL_FILE,
+        feature_store_file=FEATURE_STORE_FILE,
+        land_cover_file=LAND_COVER_FILE,
+        gridmet_file=GRIDMET_FILE,
+        check_interval=RELOAD_CHECK_INTERVAL,
+        feature_names=FEATURE_NAMES,
+    ):
+        self.model_file = model_file
+        self.compiled_model_file = compiled_model_file
+        self.feature_store_file = feature_store_file
+        self.land_cover_file = land_cover_file
+        self.gridmet_file = gridmet_file
+        self.check_interval = check_interval
+        self.feature_names = feature_names
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._failure = None  # (monotonic time, message) of a failed first load
+
+    def peek(self):
+        """The current snapshot, or None if none has loaded; never loads."""
+        return self._snapshot
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            self._raise_recent_failure()
+            return self.reload()
+        if self.check_interval > 0:
+            now = time.monotonic()
+            if now - self._checked_at >= self.check_interval:
+                self._checked_at = now
+                if self._changed(snapshot):
+                    return self.reload()
+        return snapshot
+
+    def reload(self, force=False):
+        with self._lock:
+            old = self._snapshot
+            if old is None and not force:
+                # requests that queued behind a failed load fail with it
+                self._raise_recent_failure()
+            if old is not None and not force and not self._changed(old):
+                return old
+            try:
+                self._snapshot = self._load(old)
+            except Exception as e:
+                if old is None:
+                    self._failure = (time.monotonic(), str(e))
+                    print(f"Could not load the model and features: {e}")
+                    raise ModelUnavailable(str(e)) from e
+                # keep serving the previous model if the new file is half-written
+                print(f"Model reload failed, keeping version {old.model_version}: {e}")
+            self._failure = None
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def _raise_recent_failure(self):
+        failure = self._failure
+        if failure is not None and time.monotonic() - failure[0] < MODEL_RETRY_SECONDS:
+            raise ModelUnavailable(failure[1])
+
+    def _model_path(self):
+        if os.path.exists(self.compiled_model_file):
+            return self.compiled_model_file
+        return self.model_file
+
+    def _features_stamp(self):
+        """(path, stamp) of each file the grid features are read from."""
+        if os.path.exists(self.feature_store_file):
+            paths = [self.feature_store_file]
+        else:
+            paths = [self.land_cover_file]
+            if os.path.exists(self.gridmet_file):
+                paths.append(self.gridmet_file)
+        return tuple((path, file_stamp(path)) for path in paths)
+
+    def _changed(self, snapshot):
+        try:
+            return (
+                (self._model_path(), file_stamp(self._model_path()))
+                != snapshot.model_stamp
+                or self._features_stamp() != snapshot.features_stamp
+            )
+        except OSError:
+            return False
+
+    def _load(self, old):
+        model_path = self._model_path()
+        model_stamp = (model_path, file_stamp(model_path))
+        with stage("model_load"):
+            model, model_version = load_model(model_path)
+        # a model trained on other columns would score garbage, not fail
+        check_model(model, self.feature_names)
+
+        features_stamp = self._features_stamp()
+        if old is not None and old.features_stamp == features_stamp:
+            features, land_cover = old.features, old.land_cover
+        else:
+            with stage("features_load"):
+                features, land_cover, path = load_features(
+                    self.feature_store_file, self.land_cover_file, self.gridmet_file
+                )
+            print(f"Loaded grid features from {path}")
+        check_store(features, self.feature_names)
+
+        print(f"Loaded model {model_path} (version {model_version})")
+        return Snapshot(
+            model,
+            model_version,
+            model_stamp,
+            features,
+            land_cover,
+            features_stamp,
+            self.feature_names,
+        )
+
+
+registry = ModelRegistry()
+
+if os.environ.get("FIRESPOT_PRELOAD", "0") == "1":
+    try:
+        registry.get()
+    except ModelUnavailable as e:
+        sys.exit(f"FIRESPOT_PRELOAD: could not load the model and features: {e}")
@@ -0,0 +1,186 @@
+import glob
+import os
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from firespot_shared.features import day_columns, store_features
+
+from registry import registry
+
+RISK_DIR = os.environ.get("FIRESPOT_RISK_DIR", "risk")
+RISK_ENABLED = os.environ.get("FIRESPOT_RISK_RASTER", "1") == "1"
+# rows per model.predict call while scoring the whole grid
+SCORE_CHUNK = 32768
+# a build lock older than this is assumed to belong to a dead worker
+STALE_LOCK_SECONDS = 600
+# after a build elsewhere holds the lock, or fails, wait this long to retry
+BUILD_RETRY_SECONDS = 10
+
+
+def model_inputs(snapshot, lats, lons, land_cover, day):
+    """The snapshot model's feature matrix for points on `day`."""
+    month, day_of_year = day_columns(day)
+    return store_features(
+        snapshot.features,
+        lats,
+        lons,
+        month,
+        day_of_year,
+        snapshot.feature_names,
+        land_cover,
+    )
+
+
+def score_grid(snapshot, day):
+    """Fire rate for every cell of the land cover grid on `day`, as float32."""
+    land_cover = snapshot.land_cover
+    grid = land_cover.grid
+    lats = np.repeat(grid.lats(), grid.n_lon)
+    lons = np.tile(grid.lons(), grid.n_lat)
+    lc = land_cover.lookup(lats, lons)
+    rates = np.empty(len(lats), dtype=np.float32)
+    for start in range(0, len(lats), SCORE_CHUNK):
+        end = start + SCORE_CHUNK
+        x = model_inputs(snapshot, lats[start:end], lons[start:end], lc[start:end], day)
+        rates[start:end] = snapshot.model.predict(x)
+    return rates.reshape(grid.shape)
+
+
+def raster_path(version, day, risk_dir=RISK_DIR):
+    return os.path.join(risk_dir, f"risk-{version}-{day:%Y-%m-%d}.npy")
+
+
+def write_raster(path, rates):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}.npy"
+    np.save(tmp, rates)
+    os.replace(tmp, path)
+
+
+def build_raster(snapshot, day, risk_dir=RISK_DIR):
+    path = raster_path(snapshot.version, day, risk_dir)
+    start = time.perf_counter()
+    write_raster(path, score_grid(snapshot, day))
+    print(f"Risk raster {path} built in {time.perf_counter() - start:.1f}s")
+    return path
+
+
+def _acquire_lock(path):
+    lock = f"{path}.lock"
+    try:
+        if time.time() - os.path.getmtime(lock) > STALE_LOCK_SECONDS:
+            os.remove(lock)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return lock
+    except FileExistsError:
+        return None
+
+
+class RiskRasters:
+    """
+    Per-process handle on the precomputed national risk raster.
+
+    get() returns the memory-mapped raster for the snapshot's version
+    and the given day, or None while it does not exist yet. A missing raster
+    is built in a background thread by whichever worker grabs the lock file
+    first; the finished file is renamed into place, and every worker swaps
+    to it on its next request. Workers that find the lock taken wait
+    BUILD_RETRY_SECONDS before looking again. A daemon thread rebuilds after
+    each midnight.
+    """
+
+    def __init__(self, risk_dir=RISK_DIR):
+        self.risk_dir = risk_dir
+        self._current = None  # (version, day, array)
+        self._next_build = {}  # (version, day) -> monotonic time of next try
+        self._lock = threading.Lock()
+        self._refresher = None
+
+    def get(self, snapshot, day):
+        current = self._current
+        if current is not None and current[:2] == (snapshot.version, day):
+            return current[2]
+
+        path = raster_path(snapshot.version, day, self.risk_dir)
+        if os.path.exists(path):
+            rates = np.load(path, mmap_mode="r")
+            if rates.shape == snapshot.land_cover.grid.shape:
+                self._current = (snapshot.version, day, rates)
+                return rates
+        self._build_in_background(snapshot, day)
+        self._start_refresher()
+        return None
+
+    def _build_in_background(self, snapshot, day):
+        key = (snapshot.version, day)
+        with self._lock:
+            if time.monotonic() < self._next_build.get(key, 0.0):
+                return
+            # a running build blocks retries until it finishes
+            self._next_build[key] = float("inf")
+        threading.Thread(target=self._build, args=(snapshot, day), daemon=True).start()
+
+    def _build(self, snapshot, day):
+        path = raster_path(snapshot.version, day, self.risk_dir)
+        retry_at = time.monotonic() + BUILD_RETRY_SECONDS
+        try:
+            os.makedirs(self.risk_dir, exist_ok=True)
+            lock = _acquire_lock(path)
+            if lock is None:
+                # another worker is building it; get() maps the file once it lands
+                return
+            try:
+                if not os.path.exists(path):
+                    build_raster(snapshot, day, self.risk_dir)
+                self._remove_old(path)
+                retry_at = 0.0
+            finally:
+                os.remove(lock)
+        except (OSError, ValueError) as e:
+            print(f"Risk raster build for {day} failed: {e}")
+        finally:
+            with self._lock:
+                if retry_at:
+                    self._next_build[(snapshot.version, day)] = retry_at
+                else:
+                    self._next_build.pop((snapshot.version, day), None)
+
+    def _remove_old(self, keep):
+        # workers still mapping an old file keep their pages until they swap
+        for path in glob.glob(os.path.join(self.risk_dir, "risk-*.npy")):
+            if path != keep and time.time() - os.path.getmtime(path) > 86400:
+                os.remove(path)
+
+    def _start_refresher(self):
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop, daemon=True)
+        self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            now = datetime.now()
+            tomorrow = datetime.combine(
+                now.date() + timedelta(days=1), datetime.min.time()
+            )
+            time.sleep((tomorrow - now).total_seconds() + 1)
+            self.get(registry.get(), datetime.now().date())
+
+
+rasters = RiskRasters()
+
+
+if __name__ == "__main__":
+    # cron entry point: python risk.py [YYYY-MM-DD]
+    if len(sys.argv) > 2:
+        print("Usage: python risk.py [YYYY-MM-DD]")
+        sys.exit(1)
+    day = date.fromisoformat(sys.argv[1]) if len(sys.argv) == 2 else date.today()
+    build_raster(registry.get(), day)
@@ -1,4 +1,4 @@
-from main import load_land_cover
+from registry import load_land_cover
 
 lc = load_land_cover()
 print(lc)
\ No newline at end of file
@@ -0,0 +1,93 @@
+import pytest
+
+import main
+from inference import inference_pool
+from registry import MODEL_RETRY_SECONDS, ModelRegistry
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "latitude=37.3",
+        "latitude=abc&longitude=-121.9",
+        "latitude=nan&longitude=-121.9",
+        "latitude=37.3&longitude=inf",
+        "latitude=37.3&longitude=-121.9&radius=inf",
+        "latitude=37.3&longitude=-121.9&step=0",
+        "latitude=37.3&longitude=-121.9&radius=100",
+        "latitude=37.3&longitude=-121.9&format=pdf",
+    ],
+)
+def test_get_map_rejects_bad_query(client, query):
+    assert client.get(f"/get-map?{query}").status_code == 400
+
+
+def test_get_map_not_modified(client):
+    first = client.get("/get-map?latitude=37.3&longitude=-121.9")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    again = client.get(
+        "/get-map?latitude=37.3&longitude=-121.9", headers={"If-None-Match": etag}
+    )
+    assert again.status_code == 304
+    assert again.data == b""
+    assert again.headers["ETag"] == etag
+
+
+def test_get_map_overloaded(client, monkeypatch):
+    monkeypatch.setattr(inference_pool, "max_pending", 0)
+    # cells no other test renders, so the response cache cannot answer
+    response = client.get("/get-map?latitude=40.12&longitude=-105.34")
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+
+def test_get_map_model_unavailable(client, monkeypatch, tmp_path):
+    missing = str(tmp_path / "missing.ubj")
+    broken = ModelRegistry(
+        model_file=missing, compiled_model_file=missing, feature_store_file=""
+    )
+    monkeypatch.setattr(main, "registry", broken)
+
+    for _ in range(2):
+        # the second request fails with the recorded error, without loading
+        response = client.get("/get-map?latitude=37.3&longitude=-121.9")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == str(int(MODEL_RETRY_SECONDS))
+        assert b"missing.ubj" in response.data
+    assert broken.peek() is None
+
+
+@pytest.mark.parametrize(
+    "body, content_type",
+    [
+        ("lat,lon\n", "text/csv"),
+        ("lat,years\n37.3,1\n", "text/csv"),
+        ("[]", "application/json"),
+        ('{"points": 3}', "application/json"),
+        ("[[37.3]]", "application/json"),
+        ("[[37.3, -121.9, NaN]]", "application/json"),
+        ("[[37.3, -121.9, Infinity]]", "application/json"),
+        ("[[37.3, -121.9, -1]]", "application/json"),
+        ("[[NaN, -121.9]]", "application/json"),
+        ("[[37.3, -500]]", "application/json"),
+        ("[[91, -121.9]]", "application/json"),
+    ],
+)
+def test_predict_batch_rejects_bad_body(client, body, content_type):
+    response = client.post("/predict-batch", data=body, content_type=content_type)
+    assert response.status_code == 400
+
+
+def test_predict_batch(client):
+    response = client.post(
+        "/predict-batch",
+        data="lat,lon,years\n37.3,-121.9,2\n40.1,-105.3,1\n",
+        content_type="text/csv",
+        headers={"Accept": "text/csv"},
+    )
+    assert response.status_code == 200
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0] == "lat,lon,fire_rate,prob"
+    assert len(lines) == 3
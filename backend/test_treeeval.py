@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+import xgboost as xgb
+from firespot_shared.treeeval import CompiledModel, export_booster
+
+
+def training_data(n=2000, n_features=6, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, n_features)).astype(np.float32)
+    y = X[:, 0] * 2 + np.sin(X[:, 1]) + (X[:, 2] > 0) + rng.normal(0, 0.1, n)
+    X[rng.random(X.shape) < 0.05] = np.nan
+    return X, y
+
+
+@pytest.mark.parametrize("early_stopping", [False, True])
+def test_compiled_model_matches_xgboost(early_stopping):
+    X, y = training_data()
+    params = {"n_estimators": 60, "max_depth": 5, "learning_rate": 0.3}
+    if early_stopping:
+        # stops well short of n_estimators, so the trees past it must be dropped
+        model = xgb.XGBRegressor(**params, early_stopping_rounds=3)
+        model.fit(X[:1500], y[:1500], eval_set=[(X[1500:], -y[1500:])], verbose=False)
+        assert model.best_iteration + 1 < params["n_estimators"]
+    else:
+        model = xgb.XGBRegressor(**params)
+        model.fit(X, y)
+
+    compiled = CompiledModel(export_booster(model.get_booster()))
+    X_test, _ = training_data(n=5000, seed=1)
+    assert np.array_equal(compiled.predict(X_test), model.predict(X_test))
@@ -0,0 +1,147 @@
+"""
+Training-set assembly shared by train.py and train2.py.
+
+Positives are every burnable cell that has burned, broadcast over the 12
+months; negatives are random unburned cells in a random month, drawn in
+batches and rejected against a dense grid of burned cells. Both are kept
+as "rows": a dict of per-row column arrays (coordinates, month, day of
+year, land cover, target) that is much smaller than the feature matrix,
+which row_features() builds from the store for any slice of rows. One
+numpy.random.Generator drives the sampling and shuffling, so a seed
+reproduces the dataset exactly.
+"""
+
+import numpy as np
+from firespot_shared.features import MISSING_LAND_COVER, store_features
+from firespot_shared.grid import GRID_RES, Grid, cell_index
+
+from tables import read_fires
+
+SEED = 42
+CONUS_BOUNDS = (24.5, 49.5, -125.0, -66.9)
+N_YEARS = 15  # 2010-2025
+NON_BURNABLE = {11, 12, 21, 22, 23, 24, 250}
+# negatives are redrawn at most this many times over before giving up
+MAX_DRAWS_PER_SAMPLE = 20
+
+
+def mid_month_day(month):
+    """day_of_year the training rows use for a month."""
+    return (np.asarray(month) - 1) * 30 + 15
+
+
+def load_fire_cells(path):
+    """
+    (cells, years_burned) from the cleaned fires dataset: each cell that has
+    burned as a (lat, lon) row, and the number of distinct years it burned
+    in, so multi-incident fires do not inflate a cell's count.
+    """
+    fires = read_fires(path, ["latitude", "longitude", "year"])
+    burned = np.unique(
+        np.column_stack([fires["latitude"], fires["longitude"], fires["year"]]),
+        axis=0,
+    )
+    cells, years_burned = np.unique(burned[:, :2], axis=0, return_counts=True)
+    return cells, years_burned
+
+
+def positive_rows(cells, years_burned, store):
+    """Every burnable cell that has burned, once per month."""
+    lc = store.land_cover().lookup(cells[:, 0], cells[:, 1], MISSING_LAND_COVER)
+    burnable = ~np.isin(lc, list(NON_BURNABLE)) & (lc != MISSING_LAND_COVER)
+    cells, years_burned, lc = cells[burnable], years_burned[burnable], lc[burnable]
+
+    month = np.tile(np.arange(1, 13), len(cells))
+    return {
+        "latitude": np.repeat(cells[:, 0], 12),
+        "longitude": np.repeat(cells[:, 1], 12),
+        "month": month,
+        "day_of_year": mid_month_day(month),
+        "land_cover": np.repeat(lc, 12),
+        "target": np.repeat(years_burned / N_YEARS, 12).astype(np.float32),
+    }
+
+
+def _bounds_grid(bounds, res=GRID_RES):
+    """Grid of every cell a point drawn inside `bounds` can snap to."""
+    lat_min, lat_max, lon_min, lon_max = bounds
+    n_lat = int(cell_index(lat_max, res) - cell_index(lat_min, res)) + 1
+    n_lon = int(cell_index(lon_max, res) - cell_index(lon_min, res)) + 1
+    return Grid(lat_min, lon_min, n_lat, n_lon, res)
+
+
+def negative_rows(cells, store, n_samples, rng, bounds=CONUS_BOUNDS):
+    """
+    Up to n_samples random cells in `bounds` that never burned, each in a
+    random month, with target 0. Fewer come back only if the draw limit
+    runs out first.
+    """
+    grid = _bounds_grid(bounds)
+    burned = np.zeros(grid.shape, dtype=bool)
+    rows, cols, inside = grid.index(cells[:, 0], cells[:, 1])
+    burned[rows[inside], cols[inside]] = True
+
+    lat_min, lat_max, lon_min, lon_max = bounds
+    kept_rows, kept_cols = [], []
+    n_kept = 0
+    draws_left = n_samples * MAX_DRAWS_PER_SAMPLE
+    while n_kept < n_samples and draws_left > 0:
+        # a little more than is still missing, since some land on fires
+        size = min(draws_left, 2 * (n_samples - n_kept) + 1024)
+        draws_left -= size
+        rows, cols, _ = grid.index(
+            rng.uniform(lat_min, lat_max, size), rng.uniform(lon_min, lon_max, size)
+        )
+        keep = ~burned[rows, cols]
+        kept_rows.append(rows[keep][: n_samples - n_kept])
+        kept_cols.append(cols[keep][: n_samples - n_kept])
+        n_kept += len(kept_rows[-1])
+
+    rows = np.concatenate(kept_rows) if kept_rows else np.empty(0, dtype=np.int64)
+    cols = np.concatenate(kept_cols) if kept_cols else np.empty(0, dtype=np.int64)
+    lats, lons = grid.lats(rows), grid.lons(cols)
+    month = rng.integers(1, 13, len(rows))
+    return {
+        "latitude": lats,
+        "longitude": lons,
+        "month": month,
+        "day_of_year": mid_month_day(month),
+        "land_cover": store.land_cover().lookup(lats, lons, MISSING_LAND_COVER),
+        "target": np.zeros(len(rows), dtype=np.float32),
+    }
+
+
+def n_rows(rows):
+    return len(rows["target"])
+
+
+def shuffle_rows(parts, rng):
+    """Concatenate rows dicts in a random order."""
+    order = rng.permutation(sum(n_rows(part) for part in parts))
+    return {
+        name: np.concatenate([part[name] for part in parts])[order] for name in parts[0]
+    }
+
+
+def split_rows(rows, test_fraction):
+    """(train, test) of already shuffled rows; the last test_fraction is test."""
+    n_test = int(round(n_rows(rows) * test_fraction))
+    cut = n_rows(rows) - n_test
+    return (
+        {name: column[:cut] for name, column in rows.items()},
+        {name: column[cut:] for name, column in rows.items()},
+    )
+
+
+def row_features(store, rows, names, start=0, stop=None):
+    """Feature matrix for rows[start:stop]."""
+    part = {name: column[start:stop] for name, column in rows.items()}
+    return store_features(
+        store,
+        part["latitude"],
+        part["longitude"],
+        part["month"],
+        part["day_of_year"],
+        names,
+        part["land_cover"],
+    )
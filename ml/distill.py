@@ -0,0 +1,259 @@
+"""
+Shrink a trained model to a serving budget.
+
+Serving cost grows with trees x depth: every prediction walks each tree
+from root to leaf. Three kinds of smaller model are compared against the
+trained one (the "teacher"):
+
+  truncated  the teacher's first k trees
+  student    fewer, shallower trees fitted to the teacher's predictions
+             for every land cover cell on random days of the year
+  table      the teacher's prediction per (cell, month), looked up rather
+             than evaluated; the backend only serves trees, so this is
+             reported to show what a per-month raster would cost in accuracy
+
+Accuracy is measured against the teacher on a fixed benchmark grid (every
+land cover cell on BENCHMARK_DAYS) and speed as the time CompiledModel.predict
+takes to score the grid for one day, which is the work of one risk raster.
+The most accurate tree model within the budget is saved.
+
+    python distill.py model2.ubj model2-small.ubj 100      # at most 100 trees
+    python distill.py model2.ubj model2-small.ubj 250ms    # one grid in 250 ms
+"""
+
+import sys
+import time
+from datetime import date
+
+import numpy as np
+import xgboost as xgb
+from firespot_shared.features import (
+    BASE_FEATURES,
+    FEATURE_NAMES,
+    day_columns,
+    store_features,
+)
+from firespot_shared.grid import NODATA
+from firespot_shared.treeeval import CompiledModel, export_booster, serving_trees
+from sklearn.metrics import r2_score
+
+from dataset import SEED, mid_month_day
+from train2 import load_feature_store
+from training import PARAMS
+
+# off mid-month, so the table's day-of-year error shows
+BENCHMARK_DAYS = [date(2025, month, 5) for month in (2, 5, 8, 11)]
+TRUNCATE_TREES = [25, 50, 100, 200, 300]
+# (max_depth, n_estimators) of the students
+STUDENTS = [(3, 100), (4, 100), (4, 200)]
+STUDENT_LEARNING_RATE = 0.1
+# random days per cell in the students' training set
+STUDENT_DAYS_PER_CELL = 4
+
+
+class LandCells:
+    """Every land cover cell of the store, in row-major order."""
+
+    def __init__(self, store):
+        land_cover = store.land_cover()
+        rows, cols = np.nonzero(land_cover.codes != NODATA)
+        self.store = store
+        self.grid = land_cover.grid
+        self.rows, self.cols = rows, cols
+        self.lats = land_cover.grid.lats(rows)
+        self.lons = land_cover.grid.lons(cols)
+        self.land_cover = land_cover.lookup(self.lats, self.lons)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def features(self, names, month, day_of_year, cells=slice(None)):
+        return store_features(
+            self.store,
+            self.lats[cells],
+            self.lons[cells],
+            month,
+            day_of_year,
+            names,
+            self.land_cover[cells],
+        )
+
+    def day_features(self, names, day):
+        return self.features(names, *day_columns(day))
+
+
+def feature_names_of(booster):
+    """
+    The booster's feature names. Models saved before names were recorded
+    (model.ubj) only carry a count, which picks the builder's column list.
+    """
+    if booster.feature_names is not None:
+        return list(booster.feature_names)
+    for names in (BASE_FEATURES, FEATURE_NAMES):
+        if len(names) == booster.num_features():
+            return list(names)
+    raise ValueError(
+        f"model has {booster.num_features()} unnamed features; expected "
+        f"{len(BASE_FEATURES)} or {len(FEATURE_NAMES)}"
+    )
+
+
+def fit_student(teacher, land, names, max_depth, n_estimators, rng):
+    n = len(land) * STUDENT_DAYS_PER_CELL
+    cells = np.repeat(np.arange(len(land)), STUDENT_DAYS_PER_CELL)
+    day = np.datetime64("2025-01-01") + rng.integers(0, 365, n)
+    month = day.astype("datetime64[M]").astype(np.int64) % 12 + 1
+    day_of_year = (day - np.datetime64("2025-01-01")).astype(np.int64) + 1
+    X = land.features(names, month, day_of_year, cells)
+    dtrain = xgb.QuantileDMatrix(X, teacher.inplace_predict(X), feature_names=names)
+    params = {
+        **PARAMS,
+        "max_depth": max_depth,
+        "learning_rate": STUDENT_LEARNING_RATE,
+    }
+    return xgb.train(params, dtrain, num_boost_round=n_estimators)
+
+
+def month_table(teacher, land, names):
+    """(12, n_lat, n_lon) teacher predictions at each month's training day."""
+    table = np.zeros((12,) + land.grid.shape, dtype=np.float32)
+    for month in range(1, 13):
+        X = land.features(names, month, int(mid_month_day(month)))
+        table[month - 1, land.rows, land.cols] = teacher.inplace_predict(X)
+    return table
+
+
+def table_predict(table, grid, X, names):
+    rows, cols, _ = grid.index(
+        X[:, names.index("latitude")], X[:, names.index("longitude")]
+    )
+    month = X[:, names.index("month")].astype(np.int64)
+    return table[month - 1, rows, cols]
+
+
+def grid_ms(predict, X):
+    start = time.perf_counter()
+    predict(X)
+    return (time.perf_counter() - start) * 1000
+
+
+def score(name, predict, expected, X_bench, X_day, booster=None):
+    pred = np.concatenate([predict(X) for X in X_bench])
+    return {
+        "name": name,
+        "booster": booster,
+        "n_trees": booster.num_boosted_rounds() if booster is not None else 0,
+        "mae": float(np.mean(np.abs(pred - expected))),
+        "max_err": float(np.max(np.abs(pred - expected))),
+        "r2": float(r2_score(expected, pred)),
+        "grid_ms": grid_ms(predict, X_day),
+    }
+
+
+def tree_candidate(name, booster, expected, X_bench, X_day):
+    compiled = CompiledModel(export_booster(booster))
+    result = score(name, compiled.predict, expected, X_bench, X_day, booster)
+    result["max_depth"] = compiled.max_depth
+    return result
+
+
+def parse_budget(text):
+    """(max trees, max grid milliseconds); one of them is None."""
+    if text.endswith("ms"):
+        return None, float(text[:-2])
+    return int(text), None
+
+
+def within(result, max_trees, max_ms):
+    if max_trees is not None:
+        return result["n_trees"] <= max_trees
+    return result["grid_ms"] <= max_ms
+
+
+def main():
+    if len(sys.argv) != 4:
+        print("Usage: python distill.py <teacher.ubj> <out.ubj> <trees | Nms>")
+        sys.exit(1)
+    teacher_path, out_path = sys.argv[1], sys.argv[2]
+    max_trees, max_ms = parse_budget(sys.argv[3])
+
+    booster = xgb.Booster()
+    booster.load_model(teacher_path)
+    teacher = serving_trees(booster)
+    names = feature_names_of(teacher)
+    land = LandCells(load_feature_store())
+    print(
+        f"Teacher: {teacher.num_boosted_rounds()} trees; benchmark grid "
+        f"{len(land):,} cells x {len(BENCHMARK_DAYS)} days"
+    )
+
+    X_bench = [land.day_features(names, day) for day in BENCHMARK_DAYS]
+    X_day = X_bench[0]
+    expected = np.concatenate([teacher.inplace_predict(X) for X in X_bench])
+
+    results = [tree_candidate("teacher", teacher, expected, X_bench, X_day)]
+    for k in TRUNCATE_TREES:
+        if k < teacher.num_boosted_rounds():
+            print(f"Truncating to {k} trees...")
+            results.append(
+                tree_candidate(f"truncated-{k}", teacher[:k], expected, X_bench, X_day)
+            )
+
+    rng = np.random.default_rng(SEED)
+    for max_depth, n_estimators in STUDENTS:
+        print(f"Fitting student: {n_estimators} trees of depth {max_depth}...")
+        student = fit_student(teacher, land, names, max_depth, n_estimators, rng)
+        results.append(
+            tree_candidate(
+                f"student-d{max_depth}-{n_estimators}",
+                student,
+                expected,
+                X_bench,
+                X_day,
+            )
+        )
+
+    print("Building month table...")
+    table = month_table(teacher, land, names)
+    results.append(
+        {
+            **score(
+                "table (not servable)",
+                lambda X: table_predict(table, land.grid, X, names),
+                expected,
+                X_bench,
+                X_day,
+            ),
+            "max_depth": 0,
+        }
+    )
+
+    base_ms = results[0]["grid_ms"]
+    print(
+        f"\n{'Model':<22} {'Trees':>5} {'Depth':>5} {'MAE':>9} {'Max err':>9} "
+        f"{'R²':>7} {'Grid ms':>9} {'Speedup':>8}"
+    )
+    for r in results:
+        print(
+            f"{r['name']:<22} {r['n_trees']:>5} {r['max_depth']:>5} "
+            f"{r['mae']:>9.6f} {r['max_err']:>9.6f} {r['r2']:>7.4f} "
+            f"{r['grid_ms']:>9.1f} {base_ms / r['grid_ms']:>7.1f}x"
+        )
+
+    fitting = [
+        r for r in results if r["booster"] is not None and within(r, max_trees, max_ms)
+    ]
+    if not fitting:
+        print(f"\nNo tree model fits the budget {sys.argv[3]}")
+        sys.exit(1)
+    best = min(fitting, key=lambda r: r["mae"])
+    best["booster"].feature_names = names
+    best["booster"].save_model(out_path)
+    print(
+        f"\nSaved {best['name']} to {out_path}: MAE {best['mae']:.6f} vs the "
+        f"teacher, grid in {best['grid_ms']:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Per-cell annual means of the GRIDMET NetCDF files (one variable-year per file).
+
+Each file is read a chunk of days at a time to get every pixel's mean over
+the year, and the pixel means are binned onto the 0.1° grid with
+np.bincount. Files are spread over a process pool; a worker holds one chunk
+of days plus a few grid-sized arrays, and hands back dense per-cell sums
+and counts that are added up per variable.
+"""
+
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import xarray as xr
+from firespot_shared.grid import CONUS_GRID, Grid, cell_index
+from firespot_shared.store import GRIDMET_VARS
+
+# clean_data2.py keeps cells with lat in [24.5, 49.5] and lon in
+# [-130.0, -66.9], bounds included: one row and column more than CONUS_GRID,
+# from the same origin
+GRIDMET_GRID = Grid(
+    CONUS_GRID.lat_min,
+    CONUS_GRID.lon_min,
+    CONUS_GRID.n_lat + 1,
+    CONUS_GRID.n_lon + 1,
+)
+
+# days read from a file at once; a CONUS day is about 6.5 MB as float64
+DAY_CHUNK = int(os.environ.get("FIRESPOT_GRIDMET_DAY_CHUNK", "16"))
+GRIDMET_WORKERS = int(
+    os.environ.get("FIRESPOT_GRIDMET_WORKERS", str(os.cpu_count() or 1))
+)
+
+
+def gridmet_files(gridmet_dir, variables=GRIDMET_VARS):
+    """{var: sorted paths of its <var>_<year>.nc files}, skipping empty vars."""
+    files = {}
+    for var in variables:
+        paths = sorted(glob.glob(os.path.join(gridmet_dir, f"{var}_*.nc")))
+        if paths:
+            files[var] = paths
+    return files
+
+
+def pixel_means(da, day_chunk=DAY_CHUNK):
+    """Each pixel's mean over the day axis, skipping NaN days; NaN if all are."""
+    da = da.transpose("day", "lat", "lon")
+    total = np.zeros(da.shape[1:], dtype=np.float64)
+    count = np.zeros(da.shape[1:], dtype=np.int64)
+    for start in range(0, da.sizes["day"], day_chunk):
+        chunk = np.asarray(
+            da.isel(day=slice(start, start + day_chunk)).values, dtype=np.float64
+        )
+        valid = ~np.isnan(chunk)
+        total += np.where(valid, chunk, 0.0).sum(axis=0)
+        count += valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / count, np.nan)
+
+
+def bin_file(path, day_chunk=DAY_CHUNK, grid=GRIDMET_GRID):
+    """Worker: (sums, counts) of a file's pixel annual means per grid cell."""
+    # open_dataset applies scale_factor, add_offset and _FillValue itself
+    with xr.open_dataset(path, decode_times=False) as ds:
+        data_var = [v for v in ds.data_vars if v != "crs"][0]
+        annual = pixel_means(ds[data_var], day_chunk)
+        rows = cell_index(ds["lat"].values, grid.res) - grid.row0
+        cols = cell_index(ds["lon"].values, grid.res) - grid.col0
+
+    row_ok = (rows >= 0) & (rows < grid.n_lat)
+    col_ok = (cols >= 0) & (cols < grid.n_lon)
+    keep = row_ok[:, None] & col_ok[None, :] & ~np.isnan(annual)
+    cells = (rows[:, None] * grid.n_lon + cols[None, :])[keep]
+    size = grid.n_lat * grid.n_lon
+    sums = np.bincount(cells, weights=annual[keep], minlength=size)
+    counts = np.bincount(cells, minlength=size)
+    return sums.reshape(grid.shape), counts.reshape(grid.shape)
+
+
+def aggregate(
+    files,
+    workers=GRIDMET_WORKERS,
+    day_chunk=DAY_CHUNK,
+    grid=GRIDMET_GRID,
+    manifest=None,
+):
+    """
+    Per-cell (sums, counts) dicts keyed by variable for gridmet_files()
+    output. Every pixel-year with data counts once towards its cell.
+
+    With a Manifest, each file's sums and counts are kept as a partial and
+    only files that are new or changed since the last run are read.
+    """
+    jobs = [(var, path) for var, paths in files.items() for path in paths]
+    partials = {}
+    digests = {}
+    if manifest is not None:
+        geometry = [grid.row0, grid.col0, grid.n_lat, grid.n_lon, grid.res]
+        for _, path in jobs:
+            digests[path] = manifest.digest([path], grid=geometry)
+            cached = manifest.get(_partition(path), digests[path])
+            if cached is not None:
+                partials[path] = (cached["sums"], cached["counts"])
+        print(f"  {len(partials)} of {len(jobs)} GRIDMET files unchanged")
+
+    stale = [path for _, path in jobs if path not in partials]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(
+            bin_file, stale, [day_chunk] * len(stale), [grid] * len(stale)
+        )
+        for path, (file_sums, file_counts) in zip(stale, results):
+            print(f"    {os.path.basename(path)}")
+            partials[path] = (file_sums, file_counts)
+            if manifest is not None:
+                manifest.put(
+                    _partition(path),
+                    digests[path],
+                    {"sums": file_sums, "counts": file_counts},
+                )
+
+    sums = {var: np.zeros(grid.shape) for var in files}
+    counts = {var: np.zeros(grid.shape, dtype=np.int64) for var in files}
+    for var, path in jobs:
+        sums[var] += partials[path][0]
+        counts[var] += partials[path][1]
+    return sums, counts
+
+
+def _partition(path):
+    return f"gridmet/{os.path.basename(path)}"
+
+
+def cell_means(sums, counts):
+    """sums / counts, NaN where a cell has no data."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
@@ -0,0 +1,283 @@
+"""
+Chunked, vectorized reader for the NIFC InFORM fire occurrence CSV.
+
+pyarrow's streaming CSV reader hands over the four columns that are used
+one fixed-size block at a time. Each block is parsed and filtered with
+array operations in a worker process, which writes the kept records to a
+spill file and returns the block's per-cell fire counts. Memory stays
+bounded by the block size and the number of distinct cells, whatever the
+size of the input.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pcsv
+from firespot_shared.grid import GRID_RES, cell_index
+
+LAT_COLUMN = "Initial Latitude"
+LON_COLUMN = "Initial Longitude"
+DATE_COLUMN = "Fire Discovery Date Time"
+TYPE_COLUMN = "Incident Type Category"
+COLUMNS = [LAT_COLUMN, LON_COLUMN, DATE_COLUMN, TYPE_COLUMN]
+
+BOUNDS = [
+    (24.5, 49.5, -130.0, -66.9),  # CONUS (extended west for offshore)
+    (51.0, 71.5, -180.0, -129.9),  # Alaska
+    (18.9, 22.2, -160.2, -154.8),  # Hawaii
+]
+
+VALID_YEARS = range(2010, 2027)
+
+# bytes of CSV per block; each worker holds about one block of columns
+BLOCK_BYTES = int(os.environ.get("FIRESPOT_INGEST_BLOCK_BYTES", str(16 << 20)))
+INGEST_WORKERS = int(
+    os.environ.get("FIRESPOT_INGEST_WORKERS", str(os.cpu_count() or 1))
+)
+
+# the strptime formats clean_data.py tried in turn: "%m/%d/%Y %I:%M:%S %p",
+# "%m/%d/%Y %H:%M:%S" and "%Y/%m/%d %H:%M:%S+00"
+_TIME = r"(?P<H>\d{1,2}):(?P<M>\d{1,2}):(?P<S>\d{1,2})"
+DATE_PATTERNS = [
+    r"^(?P<m>\d{1,2})/(?P<d>\d{1,2})/(?P<y>\d{4}) " + _TIME + r"(?P<p> [AaPp][Mm])?$",
+    r"^(?P<y>\d{4})/(?P<m>\d{1,2})/(?P<d>\d{1,2}) " + _TIME + r"\+00$",
+]
+# what float() accepts, short of underscores
+NUMBER_PATTERN = r"^[+-]?((\d+\.?\d*|\.\d+)([eE][+-]?\d+)?|(?i:nan|inf|infinity))$"
+
+DROP_REASONS = ["no_coords", "bad_bounds", "bad_date", "bad_year", "bad_type"]
+
+# a cell is one int64; the column offset keeps the remainder positive
+_KEY_ROW = 100_000
+_KEY_COL_OFFSET = 50_000
+
+
+def cell_keys(lat, lon, res=GRID_RES):
+    return cell_index(lat, res) * _KEY_ROW + (cell_index(lon, res) + _KEY_COL_OFFSET)
+
+
+def cell_coords(keys, res=GRID_RES):
+    """Snapped (lat, lon) of cell keys. Sorted keys are in (lat, lon) order."""
+    rows = keys // _KEY_ROW
+    cols = keys % _KEY_ROW - _KEY_COL_OFFSET
+    return np.round(rows * res, 6), np.round(cols * res, 6)
+
+
+def in_bounds(lat, lon):
+    mask = np.zeros(len(lat), dtype=bool)
+    for lat_min, lat_max, lon_min, lon_max in BOUNDS:
+        mask |= (
+            (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+        )
+    return mask
+
+
+def parse_numbers(values):
+    """(float64 array, parsed mask) for a string column."""
+    values = pc.utf8_trim_whitespace(values)
+    ok = pc.fill_null(pc.match_substring_regex(values, NUMBER_PATTERN), False)
+    numbers = pc.cast(pc.if_else(ok, values, None), pa.float64())
+    return numbers.to_numpy(zero_copy_only=False), ok.to_numpy(zero_copy_only=False)
+
+
+def _int_field(parts, name):
+    field = pc.struct_field(parts, name)
+    return pc.fill_null(pc.cast(field, pa.int64()), -1).to_numpy(zero_copy_only=False)
+
+
+def parse_dates(values):
+    """
+    (year, month, day_of_year) arrays for a string column; year is 0 where
+    no format matches or the date does not exist.
+    """
+    values = pc.utf8_trim_whitespace(values)
+    n = len(values)
+    year = np.zeros(n, dtype=np.int64)
+    month = np.zeros(n, dtype=np.int64)
+    day = np.zeros(n, dtype=np.int64)
+    valid = np.zeros(n, dtype=bool)
+
+    for pattern in DATE_PATTERNS:
+        unmatched = pc.if_else(pa.array(valid), None, values)
+        parts = pc.extract_regex(unmatched, pattern)
+        found = parts.is_valid().to_numpy(zero_copy_only=False)
+        if not found.any():
+            continue
+        hour = _int_field(parts, "H")
+        if "(?P<p>" in pattern:
+            twelve_hour = found & (
+                pc.fill_null(pc.utf8_length(pc.struct_field(parts, "p")), 0)
+                .to_numpy(zero_copy_only=False)
+                .astype(bool)
+            )
+        else:
+            twelve_hour = np.zeros(n, dtype=bool)
+        ok = (
+            found
+            & np.where(twelve_hour, (hour >= 1) & (hour <= 12), hour <= 23)
+            & (_int_field(parts, "M") <= 59)
+            & (_int_field(parts, "S") <= 59)
+        )
+        year = np.where(ok, _int_field(parts, "y"), year)
+        month = np.where(ok, _int_field(parts, "m"), month)
+        day = np.where(ok, _int_field(parts, "d"), day)
+        valid |= ok
+
+    # reject dates that do not exist (month 13, Feb 30, year 0)
+    valid &= (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1)
+    # months since 1970, which is what datetime64[M] counts
+    months = (np.where(valid, year, 1970) - 1970) * 12 + np.where(valid, month, 1) - 1
+    month_start = months.astype("datetime64[M]").astype("datetime64[D]")
+    next_month = (months + 1).astype("datetime64[M]").astype("datetime64[D]")
+    valid &= day <= (next_month - month_start).astype(np.int64)
+    date = month_start + np.where(valid, day - 1, 0)
+    year_start = date.astype("datetime64[Y]").astype("datetime64[D]")
+    day_of_year = (date - year_start).astype(np.int64) + 1
+
+    return (
+        np.where(valid, year, 0).astype(np.int16),
+        np.where(valid, month, 0).astype(np.int8),
+        np.where(valid, day_of_year, 0).astype(np.int16),
+    )
+
+
+def filter_batch(batch):
+    """
+    Apply the coordinate, bounds, date, year and incident type filters in
+    that order. Returns the kept records as arrays and per-reason drop counts.
+    """
+    lat, lat_ok = parse_numbers(batch.column(LAT_COLUMN))
+    lon, lon_ok = parse_numbers(batch.column(LON_COLUMN))
+    has_coords = lat_ok & lon_ok
+    bounded = has_coords & in_bounds(lat, lon)
+
+    year, month, day_of_year = parse_dates(batch.column(DATE_COLUMN))
+    dated = bounded & (year > 0)
+    in_years = dated & (year >= VALID_YEARS.start) & (year < VALID_YEARS.stop)
+    incident_type = pc.utf8_upper(pc.utf8_trim_whitespace(batch.column(TYPE_COLUMN)))
+    wildfire = in_years & pc.equal(incident_type, "WF").to_numpy(zero_copy_only=False)
+
+    stages = [has_coords, bounded, dated, in_years, wildfire]
+    passed = [batch.num_rows] + [int(mask.sum()) for mask in stages]
+    drops = {reason: passed[i] - passed[i + 1] for i, reason in enumerate(DROP_REASONS)}
+    records = {
+        "cell": cell_keys(lat[wildfire], lon[wildfire]),
+        "year": year[wildfire],
+        "month": month[wildfire],
+        "day_of_year": day_of_year[wildfire],
+    }
+    return records, drops
+
+
+def process_batch(batch, spill_path):
+    """Worker: filter a block, spill its records, return its cell counts."""
+    records, drops = filter_batch(batch)
+    np.savez(spill_path, **records)
+    cells, counts = np.unique(records["cell"], return_counts=True)
+    return spill_path, cells, counts, drops, batch.num_rows
+
+
+class FireIncidents:
+    """Result of ingest(): totals, per-cell fire counts and the spill files."""
+
+    def __init__(self):
+        self.total = 0
+        self.kept = 0
+        self.drops = dict.fromkeys(DROP_REASONS, 0)
+        self.density_cells = np.empty(0, dtype=np.int64)
+        self.density_counts = np.empty(0, dtype=np.int64)
+        self.spills = []
+
+    def add(self, spill_path, cells, counts, drops, n_rows):
+        self.spills.append(spill_path)
+        self.total += n_rows
+        self.kept += int(counts.sum())
+        for reason, n in drops.items():
+            self.drops[reason] += n
+        merged, inverse = np.unique(
+            np.concatenate([self.density_cells, cells]), return_inverse=True
+        )
+        self.density_counts = np.bincount(
+            inverse, weights=np.concatenate([self.density_counts, counts])
+        ).astype(np.int64)
+        self.density_cells = merged
+
+    def summary(self):
+        """Everything but the records, as arrays for an .npz."""
+        return {
+            "totals": np.array(
+                [self.total, self.kept] + [self.drops[r] for r in DROP_REASONS]
+            ),
+            "density_cells": self.density_cells,
+            "density_counts": self.density_counts,
+        }
+
+    @classmethod
+    def from_summary(cls, arrays):
+        """A FireIncidents without records, from summary() output."""
+        fires = cls()
+        fires.total, fires.kept, *drops = arrays["totals"].tolist()
+        fires.drops = dict(zip(DROP_REASONS, drops))
+        fires.density_cells = arrays["density_cells"]
+        fires.density_counts = arrays["density_counts"]
+        return fires
+
+    def records(self):
+        """Kept records block by block, in input file order."""
+        for path in self.spills:
+            with np.load(path) as spill:
+                yield {name: spill[name] for name in spill.files}
+
+    def table_blocks(self, land_cover):
+        """
+        records() joined with each cell's snapped coordinates, fire count and
+        its value in `land_cover` (aligned with density_cells), as the
+        columns of the cleaned fires table.
+        """
+        lats, lons = cell_coords(self.density_cells)
+        for records in self.records():
+            i = np.searchsorted(self.density_cells, records["cell"])
+            yield {
+                "latitude": lats[i],
+                "longitude": lons[i],
+                "year": records["year"],
+                "month": records["month"],
+                "day_of_year": records["day_of_year"],
+                "land_cover": land_cover[i],
+                "fire_density": self.density_counts[i],
+            }
+
+
+def read_batches(path, block_bytes=BLOCK_BYTES):
+    return pcsv.open_csv(
+        path,
+        read_options=pcsv.ReadOptions(block_size=block_bytes),
+        convert_options=pcsv.ConvertOptions(
+            include_columns=COLUMNS,
+            column_types={name: pa.string() for name in COLUMNS},
+            strings_can_be_null=False,
+        ),
+    )
+
+
+def ingest(path, spill_dir, workers=INGEST_WORKERS, block_bytes=BLOCK_BYTES):
+    """
+    Read and filter the incident CSV with a process pool. At most two blocks
+    per worker are in flight, so reading never runs far ahead of parsing.
+    """
+    fires = FireIncidents()
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for i, batch in enumerate(read_batches(path, block_bytes)):
+            spill_path = os.path.join(spill_dir, f"fires-{i:06d}.npz")
+            pending.append(pool.submit(process_batch, batch, spill_path))
+            if len(pending) >= 2 * workers:
+                fires.add(*pending.popleft().result())
+                print(f"  {fires.total:,} rows read")
+        while pending:
+            fires.add(*pending.popleft().result())
+    return fires
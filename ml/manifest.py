@@ -0,0 +1,117 @@
+"""
+Content-hashed cache of partial results for incremental re-cleaning.
+
+A partition (the fire records, the land cover grid, one GRIDMET file) is
+saved as an .npz next to manifest.json together with a digest of its
+inputs' SHA-256 hashes and parameters. On the next run a partition whose
+digest is unchanged, and whose output files are as it left them, is loaded
+instead of recomputed. Hashes are reused while a file's size and mtime are
+unchanged. Delete the cache directory to force a full rebuild.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# bump when a partition's contents change meaning, to drop old caches
+CACHE_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+
+def _stat(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+class Manifest:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, MANIFEST_FILE)
+        os.makedirs(cache_dir, exist_ok=True)
+        self.files = {}
+        self.partitions = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                self.files = data["files"]
+                self.partitions = data["partitions"]
+        self.used = set()
+
+    def file_hash(self, path):
+        """SHA-256 of a file's contents, rehashed only if its stat changed."""
+        path = os.path.abspath(path)
+        stat = _stat(path)
+        entry = self.files.get(path)
+        if entry is None or {k: entry[k] for k in stat} != stat:
+            with open(path, "rb") as f:
+                sha = hashlib.file_digest(f, "sha256").hexdigest()
+            entry = self.files[path] = {**stat, "sha256": sha}
+        return entry["sha256"]
+
+    def digest(self, inputs, **params):
+        """Key for a partition computed from `inputs` with `params`."""
+        key = {
+            "version": CACHE_VERSION,
+            "inputs": [self.file_hash(path) for path in inputs],
+            "params": params,
+        }
+        return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+    def _partial_path(self, name):
+        return os.path.join(self.cache_dir, name.replace("/", "-") + ".npz")
+
+    def get(self, name, digest):
+        """The arrays saved for `name` under `digest`, or None if stale."""
+        self.used.add(name)
+        entry = self.partitions.get(name)
+        partial = self._partial_path(name)
+        if entry is None or entry["digest"] != digest or not os.path.exists(partial):
+            return None
+        for path, stat in entry["outputs"].items():
+            if not os.path.exists(path) or _stat(path) != stat:
+                return None
+        with np.load(partial) as data:
+            return {key: data[key] for key in data.files}
+
+    def put(self, name, digest, arrays, outputs=()):
+        """
+        Save a partition's arrays and the current state of the output files
+        it wrote. The manifest is rewritten at once so a failed run keeps
+        what it finished.
+        """
+        self.used.add(name)
+        partial = self._partial_path(name)
+        tmp = f"{partial}.tmp{os.getpid()}"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, partial)
+        self.partitions[name] = {
+            "digest": digest,
+            "outputs": {os.path.abspath(path): _stat(path) for path in outputs},
+        }
+        self.save()
+
+    def prune(self):
+        """Forget partitions not looked up this run, e.g. for removed inputs."""
+        for name in set(self.partitions) - self.used:
+            del self.partitions[name]
+            if os.path.exists(self._partial_path(name)):
+                os.remove(self._partial_path(name))
+        self.save()
+
+    def save(self):
+        tmp = f"{self.path}.tmp{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": CACHE_VERSION,
+                    "files": self.files,
+                    "partitions": self.partitions,
+                },
+                f,
+                indent=1,
+            )
+        os.replace(tmp, self.path)
@@ -1,25 +1,25 @@
-import csv
+import os
 import sys
 from datetime import UTC, datetime
 
 import numpy as np
 import xgboost as xgb
+from firespot_shared.features import BASE_FEATURES, build_features, check_model
+from firespot_shared.grid import LandCoverGrid
+from firespot_shared.store import FeatureStore
 
 GRID_RES = 0.1
 RATE_SCALE = 0.067
 NON_BURNABLE = {11, 12, 31, 250}
 MODEL_FILE = "model.ubj"
 LAND_COVER_FILE = "data/land_cover.csv"
+FEATURE_STORE_FILE = "data/features.bin"
 
 
 def load_land_cover(path):
-    lc = {}
-    with open(path, newline="") as f:
-        for row in csv.DictReader(f):
-            lat = round(float(row["lat_cell"]), 6)
-            lon = round(float(row["lon_cell"]), 6)
-            lc[(lat, lon)] = int(row["land_cover"])
-    return lc
+    if os.path.exists(FEATURE_STORE_FILE):
+        return FeatureStore(FEATURE_STORE_FILE).land_cover()
+    return LandCoverGrid.from_csv(path)
 
 
 def snap(lat, lon):
@@ -32,6 +32,7 @@ def snap(lat, lon):
 def predict(lat, lon, years=1.0):
     model = xgb.XGBRegressor()
     model.load_model(MODEL_FILE)
+    check_model(model, BASE_FEATURES)
     land_cover = load_land_cover(LAND_COVER_FILE)
 
     today = datetime.now(UTC)
@@ -39,12 +40,12 @@ def predict(lat, lon, years=1.0):
     day_of_year = today.timetuple().tm_yday
 
     slat, slon = snap(lat, lon)
-    lc = land_cover.get((slat, slon), -1)
+    lc = land_cover.get(slat, slon, -1)
 
     if lc in NON_BURNABLE:
         return {"lat": lat, "lon": lon, "fire_rate": 0.0, "prob": 0.0}
 
-    X = np.array([[lat, lon, month, day_of_year, lc]], dtype=np.float32)
+    X = build_features([lat], [lon], month, day_of_year, [lc], names=BASE_FEATURES)
     cell_rate = float(np.clip(model.predict(X), 0, None)[0])
 
     rate = cell_rate * RATE_SCALE
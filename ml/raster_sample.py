@@ -0,0 +1,164 @@
+"""
+Point sampling from a tiled GeoTIFF such as the NLCD land cover raster.
+
+Points are reprojected in one call and mapped to pixels, then grouped by
+the file's internal block layout: every block that holds a requested pixel
+is read once, whole, and its pixels are gathered with array indexing.
+Blocks are read in parallel, one dataset handle per thread.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import rasterio
+from firespot_shared.grid import GRID_RES
+from rasterio.transform import rowcol
+from rasterio.warp import transform as warp_transform
+from rasterio.windows import Window
+
+SAMPLE_WORKERS = int(
+    os.environ.get("FIRESPOT_SAMPLE_WORKERS", str(min(8, os.cpu_count() or 1)))
+)
+# points per side of the lattice voted over in each 0.1° cell; 1 takes the
+# pixel under the cell center
+LAND_COVER_SAMPLES = int(os.environ.get("FIRESPOT_LAND_COVER_SAMPLES", "1"))
+# points reprojected and read per round when voting, to bound memory
+POINT_CHUNK = 1 << 20
+
+# value for points that fall outside the raster
+NO_VALUE = -1
+
+
+def pixel_indices(dataset, lats, lons):
+    """(rows, cols) of the dataset pixels under WGS84 points."""
+    xs, ys = warp_transform("EPSG:4326", dataset.crs, lons, lats)
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    rows = np.full(len(xs), -1, dtype=np.int64)
+    cols = np.full(len(xs), -1, dtype=np.int64)
+    ok = np.isfinite(xs) & np.isfinite(ys)
+    if ok.any():
+        r, c = rowcol(dataset.transform, xs[ok], ys[ok])
+        rows[ok] = r
+        cols[ok] = c
+    return rows, cols
+
+
+def read_pixels(dataset, rows, cols, workers=SAMPLE_WORKERS):
+    """Band 1 values at (row, col) pairs; NO_VALUE outside the raster."""
+    out = np.full(len(rows), NO_VALUE, dtype=np.int64)
+    inside = (
+        (rows >= 0) & (rows < dataset.height) & (cols >= 0) & (cols < dataset.width)
+    )
+    points = np.flatnonzero(inside)
+    if len(points) == 0:
+        return out
+
+    block_h, block_w = dataset.block_shapes[0]
+    block_cols = -(-dataset.width // block_w)
+    block = (rows[points] // block_h) * block_cols + cols[points] // block_w
+    order = np.argsort(block, kind="stable")
+    points, block = points[order], block[order]
+    starts = np.flatnonzero(np.diff(block)) + 1
+    groups = np.split(points, starts)
+
+    local = threading.local()
+    handles = []
+    lock = threading.Lock()
+
+    def read_group(group):
+        if workers <= 1:
+            handle = dataset
+        else:
+            handle = getattr(local, "handle", None)
+            if handle is None:
+                # rasterio datasets must not be shared between threads
+                handle = local.handle = rasterio.open(dataset.name)
+                with lock:
+                    handles.append(handle)
+        r0 = rows[group[0]] // block_h * block_h
+        c0 = cols[group[0]] // block_w * block_w
+        window = Window(
+            c0, r0, min(block_w, dataset.width - c0), min(block_h, dataset.height - r0)
+        )
+        data = handle.read(1, window=window)
+        out[group] = data[rows[group] - r0, cols[group] - c0]
+
+    try:
+        if workers <= 1:
+            for group in groups:
+                read_group(group)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(read_group, groups))
+    finally:
+        for handle in handles:
+            handle.close()
+    return out
+
+
+def sample_points(dataset, lats, lons, workers=SAMPLE_WORKERS):
+    """Band 1 value under each WGS84 point; NO_VALUE off the raster."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    if len(lats) == 0:
+        return np.empty(0, dtype=np.int64)
+    return read_pixels(dataset, *pixel_indices(dataset, lats, lons), workers)
+
+
+def majority(values, nodata=None):
+    """
+    Most common value in each row, lowest first on ties. NO_VALUE and
+    `nodata` only win when a row has nothing else.
+    """
+    n, _ = values.shape
+    votes = values >= 0
+    if nodata is not None:
+        votes &= values != nodata
+    classes = np.where(votes, values, 0)
+    n_classes = int(classes.max()) + 1
+    counts = np.bincount(
+        (np.arange(n)[:, None] * n_classes + classes).ravel(),
+        weights=votes.ravel(),
+        minlength=n * n_classes,
+    ).reshape(n, n_classes)
+    out = counts.argmax(axis=1)
+    empty = ~votes.any(axis=1)
+    out[empty] = NO_VALUE
+    if nodata is not None:
+        out[empty & (values == nodata).any(axis=1)] = int(nodata)
+    return out
+
+
+def sample_cells(
+    dataset,
+    lats,
+    lons,
+    res=GRID_RES,
+    samples=LAND_COVER_SAMPLES,
+    workers=SAMPLE_WORKERS,
+):
+    """
+    Value for each grid cell centered on (lat, lon): the pixel under the
+    center, or with samples > 1 the majority over a samples x samples
+    lattice of points spread evenly across the cell.
+    """
+    if samples <= 1:
+        return sample_points(dataset, lats, lons, workers)
+
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    offsets = ((np.arange(samples) + 0.5) / samples - 0.5) * res
+    out = np.empty(len(lats), dtype=np.int64)
+    step = max(1, POINT_CHUNK // samples**2)
+    for start in range(0, len(lats), step):
+        end = min(start + step, len(lats))
+        lat_pts, lon_pts = np.broadcast_arrays(
+            lats[start:end, None, None] + offsets[None, :, None],
+            lons[start:end, None, None] + offsets[None, None, :],
+        )
+        values = sample_points(dataset, lat_pts.ravel(), lon_pts.ravel(), workers)
+        out[start:end] = majority(values.reshape(end - start, -1), dataset.nodata)
+    return out
@@ -0,0 +1,93 @@
+"""
+Typed columnar copy of the cleaned fire records.
+
+clean_data.py and clean_data2.py write the records as a Parquet dataset
+partitioned by year (fires/year=2019/part-0.parquet, ...). Readers load only
+the columns they name, already typed, instead of parsing fires_clean.csv,
+which is only written on request.
+"""
+
+import csv
+import os
+import shutil
+
+import pyarrow as pa
+import pyarrow.csv as pcsv
+import pyarrow.dataset as pds
+
+FIRES_SCHEMA = pa.schema(
+    [
+        ("latitude", pa.float64()),
+        ("longitude", pa.float64()),
+        ("year", pa.int16()),
+        ("month", pa.int8()),
+        ("day_of_year", pa.int16()),
+        ("land_cover", pa.int16()),
+        ("fire_density", pa.int32()),
+    ]
+)
+YEAR_PARTITIONING = pds.partitioning(
+    pa.schema([FIRES_SCHEMA.field("year")]), flavor="hive"
+)
+
+
+def fire_batch(columns):
+    """A FIRES_SCHEMA record batch from {column: array}."""
+    return pa.RecordBatch.from_arrays(
+        [pa.array(columns[field.name], type=field.type) for field in FIRES_SCHEMA],
+        schema=FIRES_SCHEMA,
+    )
+
+
+def write_fires(path, blocks):
+    """
+    Write {column: array} blocks as the dataset directory at `path`,
+    replacing any previous one. Returns the paths of the files written.
+    """
+    tmp = f"{path}.tmp{os.getpid()}"
+    os.makedirs(tmp)
+    written = []
+    pds.write_dataset(
+        (fire_batch(block) for block in blocks),
+        tmp,
+        schema=FIRES_SCHEMA,
+        format="parquet",
+        partitioning=YEAR_PARTITIONING,
+        basename_template="part-{i}.parquet",
+        preserve_order=True,
+        file_visitor=lambda f: written.append(os.path.relpath(f.path, tmp)),
+    )
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp, path)
+    return [os.path.join(path, name) for name in written]
+
+
+def write_fires_csv(path, blocks):
+    """The same blocks as a fires_clean.csv."""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIRES_SCHEMA.names)
+        for block in blocks:
+            writer.writerows(
+                zip(*(block[name].tolist() for name in FIRES_SCHEMA.names))
+            )
+
+
+def read_fires(path, columns):
+    """
+    {column: NumPy array} for `columns` of the fires dataset at `path`, or
+    of a fires_clean.csv if `path` is a file.
+    """
+    if os.path.isdir(path):
+        dataset = pds.dataset(path, format="parquet", partitioning=YEAR_PARTITIONING)
+        table = dataset.to_table(columns=columns)
+    else:
+        table = pcsv.read_csv(
+            path,
+            convert_options=pcsv.ConvertOptions(
+                include_columns=columns,
+                column_types={name: FIRES_SCHEMA.field(name).type for name in columns},
+            ),
+        )
+    return {name: table.column(name).to_numpy() for name in columns}
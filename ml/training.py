@@ -0,0 +1,233 @@
+"""
+XGBoost training plumbing shared by train.py and train2.py.
+
+The device is picked at run time (FIRESPOT_TRAIN_DEVICE, "auto" tries CUDA
+and falls back to CPU) and CPU training uses FIRESPOT_TRAIN_THREADS
+threads. FIRESPOT_TRAIN_MEMORY chooses how the training matrix is built:
+
+  ram       the whole feature matrix in memory, then quantized
+  iter      a QuantileDMatrix fed chunk by chunk; only the quantized
+            matrix is kept, never the float features
+  external  an ExtMemQuantileDMatrix whose quantized pages are cached on
+            disk, so memory stays around one chunk whatever the row count
+
+PhaseTimer reports wall time and peak RSS for each phase of a run.
+"""
+
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import warnings
+from contextlib import contextmanager
+
+import numpy as np
+import xgboost as xgb
+
+from dataset import n_rows, row_features
+
+TRAIN_DEVICE = os.environ.get("FIRESPOT_TRAIN_DEVICE", "auto")
+# 0 lets XGBoost use every core
+TRAIN_THREADS = int(os.environ.get("FIRESPOT_TRAIN_THREADS", "0"))
+TRAIN_MEMORY = os.environ.get("FIRESPOT_TRAIN_MEMORY", "ram")
+MEMORY_MODES = ("ram", "iter", "external")
+CHUNK_ROWS = int(os.environ.get("FIRESPOT_TRAIN_CHUNK_ROWS", str(1 << 20)))
+
+PARAMS = {
+    "objective": "reg:squarederror",
+    "max_depth": 6,
+    "learning_rate": 0.05,
+    "subsample": 0.8,
+    "colsample_bytree": 0.8,
+    "tree_method": "hist",
+    "eval_metric": "rmse",
+    "seed": 42,
+}
+N_ESTIMATORS = 500
+EARLY_STOPPING_ROUNDS = 20
+
+
+def detect_device(requested=TRAIN_DEVICE):
+    """
+    "cuda" or "cpu". With "auto", a one-round booster is trained on CUDA and
+    the device XGBoost actually used is read back from its config, since a
+    CUDA build without a visible GPU falls back to CPU with only a warning.
+    """
+    if requested != "auto":
+        return requested
+    if not xgb.build_info().get("USE_CUDA"):
+        return "cpu"
+    probe = xgb.DMatrix(np.zeros((2, 1)), label=[0.0, 1.0])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            booster = xgb.train({"device": "cuda", "tree_method": "hist"}, probe, 1)
+        except xgb.core.XGBoostError:
+            return "cpu"
+    config = json.loads(booster.save_config())
+    device = config["learner"]["generic_param"]["device"]
+    return "cuda" if device.startswith("cuda") else "cpu"
+
+
+def train_params(device, threads=TRAIN_THREADS):
+    return {**PARAMS, "device": device, "nthread": threads}
+
+
+class FeatureChunks(xgb.DataIter):
+    """Rows fed to XGBoost CHUNK_ROWS at a time, features built per chunk."""
+
+    def __init__(self, store, rows, names, chunk_rows=CHUNK_ROWS, cache_prefix=None):
+        self.store = store
+        self.rows = rows
+        self.names = names
+        self.chunk_rows = chunk_rows
+        self.start = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data):
+        if self.start >= n_rows(self.rows):
+            return False
+        stop = self.start + self.chunk_rows
+        input_data(
+            data=row_features(self.store, self.rows, self.names, self.start, stop),
+            label=self.rows["target"][self.start : stop],
+            feature_names=list(self.names),
+        )
+        self.start = stop
+        return True
+
+    def reset(self):
+        self.start = 0
+
+
+def training_matrices(
+    store, train_rows, test_rows, names, memory=TRAIN_MEMORY, cache_dir=None
+):
+    """
+    (dtrain, dtest) built the way `memory` says. The test matrix reuses the
+    training matrix's quantile cuts. `cache_dir` is required for "external".
+    """
+    if memory not in MEMORY_MODES:
+        raise ValueError(
+            f"FIRESPOT_TRAIN_MEMORY must be one of {', '.join(MEMORY_MODES)}, "
+            f"not {memory!r}"
+        )
+    if memory == "ram":
+        dtrain = xgb.QuantileDMatrix(
+            row_features(store, train_rows, names),
+            train_rows["target"],
+            feature_names=list(names),
+        )
+        dtest = xgb.QuantileDMatrix(
+            row_features(store, test_rows, names),
+            test_rows["target"],
+            feature_names=list(names),
+            ref=dtrain,
+        )
+    elif memory == "iter":
+        dtrain = xgb.QuantileDMatrix(FeatureChunks(store, train_rows, names))
+        dtest = xgb.QuantileDMatrix(FeatureChunks(store, test_rows, names), ref=dtrain)
+    else:
+        dtrain = xgb.ExtMemQuantileDMatrix(
+            FeatureChunks(
+                store, train_rows, names, cache_prefix=os.path.join(cache_dir, "train")
+            )
+        )
+        dtest = xgb.ExtMemQuantileDMatrix(
+            FeatureChunks(
+                store, test_rows, names, cache_prefix=os.path.join(cache_dir, "test")
+            ),
+            ref=dtrain,
+        )
+    return dtrain, dtest
+
+
+def fit(store, train_rows, test_rows, names, device, timer, memory=TRAIN_MEMORY):
+    """Train with early stopping on the test rows; returns the Booster."""
+    with tempfile.TemporaryDirectory(prefix="firespot-train-") as cache_dir:
+        with timer.phase("matrices"):
+            dtrain, dtest = training_matrices(
+                store, train_rows, test_rows, names, memory, cache_dir
+            )
+        with timer.phase("train"):
+            booster = xgb.train(
+                train_params(device),
+                dtrain,
+                num_boost_round=N_ESTIMATORS,
+                evals=[(dtest, "validation_0")],
+                early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+                verbose_eval=50,
+            )
+        # release the external-memory pages before their directory goes
+        del dtrain, dtest
+    return booster
+
+
+def predict_rows(booster, store, rows, names, chunk_rows=CHUNK_ROWS):
+    """Predictions for rows at the best iteration, one chunk in memory at a time."""
+    out = np.empty(n_rows(rows), dtype=np.float32)
+    for start in range(0, n_rows(rows), chunk_rows):
+        X = row_features(store, rows, names, start, start + chunk_rows)
+        out[start : start + len(X)] = booster.inplace_predict(
+            X, iteration_range=(0, booster.best_iteration + 1)
+        )
+    return out
+
+
+def feature_importances(booster, names):
+    """Normalized average gain per feature, as XGBRegressor reports it."""
+    gain = booster.get_score(importance_type="gain")
+    values = np.array([gain.get(name, 0.0) for name in names])
+    total = values.sum()
+    return values / total if total > 0 else values
+
+
+def _peak_rss_mib():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return usage / (1 << 20) if sys.platform == "darwin" else usage / 1024
+
+
+def _reset_peak_rss():
+    """Start a new peak RSS window, where the OS allows it (Linux)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _window_peak_rss_mib():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return _peak_rss_mib()
+
+
+class PhaseTimer:
+    """Wall time and peak RSS of each named phase of a run."""
+
+    def __init__(self):
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        windowed = _reset_peak_rss()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = _window_peak_rss_mib() if windowed else _peak_rss_mib()
+            self.phases.append((name, elapsed, peak))
+            print(f"  [{name}] {elapsed:.2f}s, peak RSS {peak:,.0f} MiB")
+
+    def report(self):
+        print("\nPhase               Wall (s)   Peak RSS (MiB)")
+        for name, elapsed, peak in self.phases:
+            print(f"  {name:<16} {elapsed:>9.2f}   {peak:>14,.0f}")
+        print(f"  {'total':<16} {sum(p[1] for p in self.phases):>9.2f}")
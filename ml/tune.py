@@ -0,0 +1,234 @@
+"""
+Hyperparameter search with spatially blocked K-fold cross-validation.
+
+Neighbouring 0.1° cells share land cover and climate, so a random split
+puts near-copies of the test rows in the training set and flatters R².
+Here rows are grouped into BLOCK_DEG x BLOCK_DEG degree blocks and whole
+blocks go to one fold. Trials run on a process pool; each worker quantizes
+every fold's training rows once and reuses the matrices for all the trials
+it runs, so only the boosting itself is repeated.
+
+Each trial's fold scores, fit time, model size and compiled-model predict
+throughput are appended to tune_results.csv, and the run ends by naming the
+cheapest-to-serve trial whose R² is within R2_TOLERANCE of the best.
+
+    python tune.py          # train2.py's features
+    python tune.py base     # train.py's features
+"""
+
+import csv
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import UTC, datetime
+
+import numpy as np
+import xgboost as xgb
+from firespot_shared.features import BASE_FEATURES, FEATURE_NAMES
+from firespot_shared.treeeval import CompiledModel, export_booster
+from sklearn.metrics import mean_absolute_error, r2_score
+
+from dataset import (
+    SEED,
+    load_fire_cells,
+    n_rows,
+    negative_rows,
+    positive_rows,
+    row_features,
+    shuffle_rows,
+)
+from train2 import DATA_FILE, load_feature_store
+from training import train_params
+
+RESULTS_FILE = os.path.join(os.path.dirname(__file__), "data", "tune_results.csv")
+
+TUNE_FOLDS = int(os.environ.get("FIRESPOT_TUNE_FOLDS", "5"))
+BLOCK_DEG = float(os.environ.get("FIRESPOT_TUNE_BLOCK_DEG", "1.0"))
+# "spatial" (blocked) or "random" folds; random is there to show the leak
+TUNE_SPLIT = os.environ.get("FIRESPOT_TUNE_SPLIT", "spatial")
+# threads per trial, and trials at once; the product should fit the machine
+TUNE_THREADS = int(os.environ.get("FIRESPOT_TUNE_THREADS", "1"))
+TUNE_WORKERS = int(
+    os.environ.get(
+        "FIRESPOT_TUNE_WORKERS", str(max(1, (os.cpu_count() or 1) // TUNE_THREADS))
+    )
+)
+MAX_BIN = 256
+R2_TOLERANCE = 0.005
+# rows timed through CompiledModel.predict, the backend's evaluator
+THROUGHPUT_ROWS = 20000
+
+SEARCH_SPACE = [
+    {"max_depth": depth, "n_estimators": trees, "learning_rate": rate}
+    for depth, trees, rate in itertools.product(
+        [3, 4, 6, 8], [100, 250, 500], [0.05, 0.1]
+    )
+]
+
+RESULT_COLS = [
+    "timestamp",
+    "features",
+    "split",
+    "folds",
+    "block_deg",
+    "max_depth",
+    "n_estimators",
+    "learning_rate",
+    "r2_mean",
+    "r2_std",
+    "mae_mean",
+    "rmse_mean",
+    "fit_seconds",
+    "predict_rows_per_s",
+]
+
+
+def assign_folds(rows, n_folds, rng, split=TUNE_SPLIT, block_deg=BLOCK_DEG):
+    """Fold number of every row, whole blocks at a time for "spatial"."""
+    if split == "random":
+        return rng.permutation(n_rows(rows)) % n_folds
+    if split != "spatial":
+        raise ValueError(f"FIRESPOT_TUNE_SPLIT must be spatial or random, not {split}")
+    block_lat = np.floor(rows["latitude"] / block_deg).astype(np.int64)
+    block_lon = np.floor(rows["longitude"] / block_deg).astype(np.int64)
+    _, block = np.unique(
+        np.column_stack([block_lat, block_lon]), axis=0, return_inverse=True
+    )
+    block = block.ravel()
+    block_fold = rng.permutation(block.max() + 1) % n_folds
+    return block_fold[block]
+
+
+# per-worker state: the data and each fold's quantized matrices
+_worker = {}
+
+
+def _init_worker(X, y, folds, names):
+    _worker.update(X=X, y=y, folds=folds, names=list(names), matrices={})
+
+
+def _fold_matrices(k):
+    if k not in _worker["matrices"]:
+        X, y, test = _worker["X"], _worker["y"], _worker["folds"] == k
+        names = _worker["names"]
+        dtrain = xgb.QuantileDMatrix(
+            X[~test], y[~test], feature_names=names, max_bin=MAX_BIN
+        )
+        _worker["matrices"][k] = (dtrain, X[test], y[test])
+    return _worker["matrices"][k]
+
+
+def run_trial(trial):
+    """Cross-validated scores and serving cost of one SEARCH_SPACE entry."""
+    params = {
+        **train_params("cpu", TUNE_THREADS),
+        "max_depth": trial["max_depth"],
+        "learning_rate": trial["learning_rate"],
+        "max_bin": MAX_BIN,
+    }
+    r2, mae, rmse, fit_seconds = [], [], [], 0.0
+    for k in range(int(_worker["folds"].max()) + 1):
+        dtrain, X_test, y_test = _fold_matrices(k)
+        start = time.perf_counter()
+        booster = xgb.train(params, dtrain, num_boost_round=trial["n_estimators"])
+        fit_seconds += time.perf_counter() - start
+        y_pred = np.clip(booster.inplace_predict(X_test), 0, None)
+        r2.append(r2_score(y_test, y_pred))
+        mae.append(mean_absolute_error(y_test, y_pred))
+        rmse.append(float(np.sqrt(np.mean((y_test - y_pred) ** 2))))
+
+    compiled = CompiledModel(export_booster(booster))
+    sample = X_test[:THROUGHPUT_ROWS]
+    start = time.perf_counter()
+    compiled.predict(sample)
+    throughput = len(sample) / (time.perf_counter() - start)
+
+    return {
+        **trial,
+        "r2_mean": float(np.mean(r2)),
+        "r2_std": float(np.std(r2)),
+        "mae_mean": float(np.mean(mae)),
+        "rmse_mean": float(np.mean(rmse)),
+        "fit_seconds": fit_seconds,
+        "predict_rows_per_s": throughput,
+    }
+
+
+def append_results(path, results):
+    new_file = not os.path.exists(path)
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLS)
+        if new_file:
+            writer.writeheader()
+        writer.writerows(results)
+
+
+def main():
+    feature_set = sys.argv[1] if len(sys.argv) > 1 else "full"
+    if feature_set not in ("base", "full"):
+        print("Usage: python tune.py [base|full]")
+        sys.exit(1)
+    names = BASE_FEATURES if feature_set == "base" else FEATURE_NAMES
+
+    print("Building training rows...")
+    cells, years_burned = load_fire_cells(DATA_FILE)
+    store = load_feature_store()
+    rng = np.random.default_rng(SEED)
+    positives = positive_rows(cells, years_burned, store)
+    negatives = negative_rows(cells, store, n_rows(positives), rng)
+    rows = shuffle_rows([positives, negatives], rng)
+    X = row_features(store, rows, names)
+    y = rows["target"]
+    folds = assign_folds(rows, TUNE_FOLDS, rng)
+    print(
+        f"  {len(y):,} rows, {TUNE_FOLDS} {TUNE_SPLIT} folds "
+        f"(sizes {', '.join(f'{n:,}' for n in np.bincount(folds))})"
+    )
+
+    print(
+        f"Running {len(SEARCH_SPACE)} trials, {TUNE_WORKERS} at a time "
+        f"with {TUNE_THREADS} thread(s) each..."
+    )
+    timestamp = datetime.now(UTC).isoformat(timespec="seconds")
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=TUNE_WORKERS,
+        initializer=_init_worker,
+        initargs=(X, y, folds, names),
+    ) as pool:
+        for result in pool.map(run_trial, SEARCH_SPACE):
+            print(
+                f"  depth={result['max_depth']} trees={result['n_estimators']} "
+                f"lr={result['learning_rate']}: R² {result['r2_mean']:.4f} "
+                f"± {result['r2_std']:.4f}, "
+                f"{result['predict_rows_per_s']:,.0f} rows/s"
+            )
+            results.append(
+                {
+                    "timestamp": timestamp,
+                    "features": feature_set,
+                    "split": TUNE_SPLIT,
+                    "folds": TUNE_FOLDS,
+                    "block_deg": BLOCK_DEG,
+                    **result,
+                }
+            )
+
+    append_results(RESULTS_FILE, results)
+    print(f"\nResults appended to: {RESULTS_FILE}")
+
+    best = max(results, key=lambda r: r["r2_mean"])
+    good = [r for r in results if r["r2_mean"] >= best["r2_mean"] - R2_TOLERANCE]
+    fastest = max(good, key=lambda r: r["predict_rows_per_s"])
+    for label, r in [("Best R²", best), (f"Fastest within {R2_TOLERANCE}", fastest)]:
+        print(
+            f"{label}: depth={r['max_depth']} trees={r['n_estimators']} "
+            f"lr={r['learning_rate']} -> R² {r['r2_mean']:.4f}, "
+            f"{r['predict_rows_per_s']:,.0f} rows/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+"""
+Code that training (ml/) and serving (backend/) must agree on: the 0.1°
+grid, the feature store file format, the feature columns and the compiled
+tree format. Both projects depend on this package, so they can't drift apart.
+"""
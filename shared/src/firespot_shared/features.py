@@ -0,0 +1,104 @@
+import numpy as np
+
+from .store import GRIDMET_VARS
+
+# Column order the models are trained on. model.ubj (train.py) uses the base
+# columns, model2.ubj (train2.py) the full list; reordering either needs a
+# retrain.
+BASE_FEATURES = ["latitude", "longitude", "month", "day_of_year", "land_cover"]
+FEATURE_NAMES = BASE_FEATURES + GRIDMET_VARS
+FEATURE_DTYPE = np.float32
+
+# values a column takes where its source has no data, as in training
+MISSING_LAND_COVER = -1
+MISSING_GRIDMET = 0.0
+
+
+def day_columns(day):
+    """(month, day_of_year) features for a date."""
+    return day.month, day.timetuple().tm_yday
+
+
+def build_features(
+    lats, lons, month, day_of_year, land_cover, gridmet=None, names=FEATURE_NAMES
+):
+    """
+    Feature matrix with one row per point and columns in `names` order.
+
+    `month` and `day_of_year` may be scalars or per-point arrays. `gridmet`
+    maps variable name to per-point values; absent variables and NaN values
+    become MISSING_GRIDMET.
+    """
+    gridmet = gridmet or {}
+    columns = {
+        "latitude": lats,
+        "longitude": lons,
+        "month": month,
+        "day_of_year": day_of_year,
+        "land_cover": land_cover,
+    }
+    X = np.empty((len(lats), len(names)), dtype=FEATURE_DTYPE)
+    for j, name in enumerate(names):
+        if name in columns:
+            X[:, j] = columns[name]
+        elif name in GRIDMET_VARS:
+            values = gridmet.get(name)
+            if values is None:
+                X[:, j] = MISSING_GRIDMET
+            else:
+                X[:, j] = values
+                np.nan_to_num(X[:, j], copy=False, nan=MISSING_GRIDMET)
+        else:
+            raise ValueError(f"unknown feature {name!r}")
+    return X
+
+
+def sample_gridmet(store, lats, lons):
+    """GRIDMET values at the points from the store's layers (NaN where missing)."""
+    return {
+        var: store.sample(var, lats, lons, np.nan)
+        for var in GRIDMET_VARS
+        if var in store
+    }
+
+
+def store_features(
+    store, lats, lons, month, day_of_year, names=FEATURE_NAMES, land_cover=None
+):
+    """build_features with land cover and GRIDMET sampled from a FeatureStore."""
+    if land_cover is None:
+        land_cover = store.land_cover().lookup(lats, lons, MISSING_LAND_COVER)
+    gridmet = None
+    if any(name in GRIDMET_VARS for name in names):
+        gridmet = sample_gridmet(store, lats, lons)
+    return build_features(lats, lons, month, day_of_year, land_cover, gridmet, names)
+
+
+def model_schema(model):
+    """(feature count, feature names or None) of an XGBRegressor or CompiledModel."""
+    if hasattr(model, "get_booster"):
+        booster = model.get_booster()
+        return booster.num_features(), booster.feature_names
+    return model.num_features(), model.feature_names or None
+
+
+def check_model(model, names=FEATURE_NAMES):
+    """Raise ValueError unless the model was trained on exactly `names`."""
+    n_features, model_names = model_schema(model)
+    if n_features != len(names):
+        raise ValueError(
+            f"model expects {n_features} features, the feature builder "
+            f"produces {len(names)} ({', '.join(names)})"
+        )
+    # models saved before feature names were recorded only carry a count
+    if model_names is not None and list(model_names) != list(names):
+        raise ValueError(
+            f"model features {list(model_names)} do not match {list(names)}"
+        )
+
+
+def check_store(store, names=FEATURE_NAMES):
+    """Raise ValueError if the store lacks a layer the features need."""
+    missing = [var for var in GRIDMET_VARS if var in names and var not in store]
+    if missing:
+        raise ValueError(f"feature store has no {', '.join(missing)} layers")
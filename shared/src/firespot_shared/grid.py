@@ -0,0 +1,96 @@
+import numpy as np
+
+GRID_RES = 0.1
+
+# CONUS box rasterized by clean_data.py Pass 3 (lat rows x lon cols)
+CONUS_LAT_MIN = 24.5
+CONUS_LON_MIN = -130.0
+CONUS_N_LAT = 250
+CONUS_N_LON = 631
+
+# uint8 slot for the -1 "no NLCD value" code in land_cover.csv
+NODATA = 255
+
+
+def cell_index(values, res=GRID_RES):
+    """Integer cell number along one axis, the same rounding snap() uses."""
+    return np.rint(np.asarray(values, dtype=np.float64) / res).astype(np.int64)
+
+
+class Grid:
+    """A regular lat/lon raster addressed by integer (row, col)."""
+
+    def __init__(self, lat_min, lon_min, n_lat, n_lon, res=GRID_RES):
+        self.res = res
+        self.n_lat = n_lat
+        self.n_lon = n_lon
+        self.row0 = int(cell_index(lat_min, res))
+        self.col0 = int(cell_index(lon_min, res))
+
+    @property
+    def shape(self):
+        return (self.n_lat, self.n_lon)
+
+    @property
+    def lat_min(self):
+        return round(self.row0 * self.res, 6)
+
+    @property
+    def lon_min(self):
+        return round(self.col0 * self.res, 6)
+
+    def index(self, lat, lon):
+        """Return (rows, cols, inside) for scalar or array coordinates."""
+        rows = cell_index(lat, self.res) - self.row0
+        cols = cell_index(lon, self.res) - self.col0
+        inside = (rows >= 0) & (rows < self.n_lat) & (cols >= 0) & (cols < self.n_lon)
+        return rows, cols, inside
+
+    def lats(self, rows=None):
+        if rows is None:
+            rows = np.arange(self.n_lat)
+        return np.round((self.row0 + np.asarray(rows)) * self.res, 6)
+
+    def lons(self, cols=None):
+        if cols is None:
+            cols = np.arange(self.n_lon)
+        return np.round((self.col0 + np.asarray(cols)) * self.res, 6)
+
+
+CONUS_GRID = Grid(CONUS_LAT_MIN, CONUS_LON_MIN, CONUS_N_LAT, CONUS_N_LON)
+
+
+class LandCoverGrid:
+    """NLCD class per 0.1° cell stored as a dense uint8 array."""
+
+    def __init__(self, codes, grid=CONUS_GRID):
+        if codes.shape != grid.shape:
+            raise ValueError(f"land cover shape {codes.shape} != grid {grid.shape}")
+        self.grid = grid
+        self.codes = codes
+
+    @classmethod
+    def from_csv(cls, path, grid=CONUS_GRID):
+        table = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+        rows, cols, inside = grid.index(table[:, 0], table[:, 1])
+        values = table[:, 2].astype(np.int64)
+        codes = np.full(grid.shape, NODATA, dtype=np.uint8)
+        codes[rows[inside], cols[inside]] = np.where(
+            values[inside] < 0, NODATA, values[inside]
+        )
+        return cls(codes, grid)
+
+    def __len__(self):
+        return int(np.count_nonzero(self.codes != NODATA))
+
+    def lookup(self, lat, lon, default=-1):
+        """Vectorized land cover for coordinate arrays; `default` outside the grid."""
+        rows, cols, inside = self.grid.index(lat, lon)
+        out = np.full(np.shape(inside), default, dtype=np.int16)
+        values = self.codes[rows[inside], cols[inside]].astype(np.int16)
+        values[values == NODATA] = -1
+        out[inside] = values
+        return out
+
+    def get(self, lat, lon, default=-1):
+        return int(self.lookup(lat, lon, default))
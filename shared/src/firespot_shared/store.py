@@ -0,0 +1,189 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from .grid import CONUS_GRID, NODATA, Grid, LandCoverGrid
+
+MAGIC = b"FSPOTFS\0"
+FORMAT_VERSION = 1
+ALIGN = 64
+
+# layer name -> (dtype, fill value for cells with no data)
+LAYER_TYPES = {
+    "land_cover": (np.uint8, NODATA),
+    "fire_count": (np.int32, 0),
+}
+GRIDMET_VARS = ["erc", "fm100", "fm1000", "tmmx", "vpd", "vs"]
+for _var in GRIDMET_VARS:
+    LAYER_TYPES[_var] = (np.float32, np.nan)
+
+
+def _pad(n):
+    return -n % ALIGN
+
+
+def empty_layer(name, grid=CONUS_GRID):
+    dtype, fill = LAYER_TYPES[name]
+    return np.full(grid.shape, fill, dtype=dtype)
+
+
+def write_store(path, layers, grid=CONUS_GRID):
+    """
+    Write grid layers to a single memory-mappable file.
+
+    Layout: magic, uint32 version, uint32 header length, JSON header, then
+    each layer's raw C-order bytes starting on a 64-byte boundary. The file
+    is written next to `path` and renamed over it so readers never see a
+    partial store.
+    """
+    entries = []
+    offset = 0
+    for name, arr in layers.items():
+        if arr.shape != grid.shape:
+            raise ValueError(f"layer {name} shape {arr.shape} != grid {grid.shape}")
+        entries.append(
+            {
+                "name": name,
+                "dtype": arr.dtype.str,
+                "offset": offset,
+                "nbytes": arr.nbytes,
+            }
+        )
+        offset += arr.nbytes + _pad(arr.nbytes)
+
+    header = {
+        "res": grid.res,
+        "lat_min": grid.lat_min,
+        "lon_min": grid.lon_min,
+        "n_lat": grid.n_lat,
+        "n_lon": grid.n_lon,
+        "layers": entries,
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    prefix = len(MAGIC) + 8 + len(header_bytes)
+    data_start = prefix + _pad(prefix)
+
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.array([FORMAT_VERSION, len(header_bytes)], dtype="<u4").tobytes())
+        f.write(header_bytes)
+        f.write(b"\0" * (data_start - prefix))
+        for entry, arr in zip(entries, layers.values()):
+            f.seek(data_start + entry["offset"])
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp, path)
+
+
+class FeatureStore:
+    """Read-only view of a store file; every layer is an np.memmap."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a feature store")
+            version, header_len = np.frombuffer(f.read(8), dtype="<u4")
+            if version != FORMAT_VERSION:
+                raise ValueError(
+                    f"{path} has format version {version}, expected {FORMAT_VERSION}"
+                )
+            header = json.loads(f.read(int(header_len)))
+        prefix = len(MAGIC) + 8 + int(header_len)
+        data_start = prefix + _pad(prefix)
+
+        self.grid = Grid(
+            header["lat_min"],
+            header["lon_min"],
+            header["n_lat"],
+            header["n_lon"],
+            header["res"],
+        )
+        self.layers = {}
+        for entry in header["layers"]:
+            self.layers[entry["name"]] = np.memmap(
+                path,
+                dtype=np.dtype(entry["dtype"]),
+                mode="r",
+                offset=data_start + entry["offset"],
+                shape=self.grid.shape,
+            )
+
+    @classmethod
+    def from_layers(cls, layers, grid=CONUS_GRID):
+        """An in-memory store over arrays, e.g. from layers_from_csv()."""
+        store = cls.__new__(cls)
+        store.path = None
+        store.grid = grid
+        store.layers = dict(layers)
+        return store
+
+    def __contains__(self, name):
+        return name in self.layers
+
+    def __getitem__(self, name):
+        return self.layers[name]
+
+    def land_cover(self):
+        return LandCoverGrid(self.layers["land_cover"], self.grid)
+
+    def sample(self, name, lat, lon, default):
+        """Vectorized layer values at coordinates; `default` outside the grid."""
+        layer = self.layers[name]
+        rows, cols, inside = self.grid.index(lat, lon)
+        out = np.full(np.shape(inside), default, dtype=layer.dtype)
+        out[inside] = layer[rows[inside], cols[inside]]
+        return out
+
+
+def layers_from_csv(land_cover_path, density_path=None, gridmet_path=None):
+    """Build store layers from the CSV tables clean_data2.py writes."""
+    layers = {"land_cover": LandCoverGrid.from_csv(land_cover_path).codes}
+
+    if density_path is not None and os.path.exists(density_path):
+        table = np.loadtxt(density_path, delimiter=",", skiprows=1, ndmin=2)
+        rows, cols, inside = CONUS_GRID.index(table[:, 0], table[:, 1])
+        counts = empty_layer("fire_count")
+        counts[rows[inside], cols[inside]] = table[inside, 2]
+        layers["fire_count"] = counts
+
+    if gridmet_path is not None and os.path.exists(gridmet_path):
+        table = np.genfromtxt(
+            gridmet_path, delimiter=",", names=True, filling_values=np.nan
+        )
+        rows, cols, inside = CONUS_GRID.index(table["lat_cell"], table["lon_cell"])
+        for var in GRIDMET_VARS:
+            layer = empty_layer(var)
+            layer[rows[inside], cols[inside]] = table[var][inside]
+            layers[var] = layer
+
+    return layers
+
+
+def open_store(path, land_cover_path, density_path=None, gridmet_path=None):
+    """The store at `path`, or an in-memory one from the CSVs if it is missing."""
+    if os.path.exists(path):
+        return FeatureStore(path)
+    return FeatureStore.from_layers(
+        layers_from_csv(land_cover_path, density_path, gridmet_path)
+    )
+
+
+if __name__ == "__main__":
+    # named, so an input in the wrong slot cannot become another layer
+    parser = argparse.ArgumentParser(description="Write a feature store.")
+    parser.add_argument("out", help="store to write, e.g. features.bin")
+    parser.add_argument("--land-cover", required=True, help="land_cover.csv")
+    parser.add_argument("--density", help="fire_density.csv")
+    parser.add_argument("--gridmet", help="gridmet.csv")
+    args = parser.parse_args()
+
+    for path in (args.density, args.gridmet):
+        # layers_from_csv skips missing optional files; a named one must exist
+        if path is not None and not os.path.exists(path):
+            parser.error(f"{path} does not exist")
+    write_store(args.out, layers_from_csv(args.land_cover, args.density, args.gridmet))
+    print(f"Feature store written to: {args.out}")
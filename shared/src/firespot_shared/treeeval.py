@@ -0,0 +1,214 @@
+import json
+import sys
+
+import numpy as np
+
+# rows evaluated at once; each step holds a (rows x trees) int32 node array
+EVAL_CHUNK = 1024
+
+
+def serving_trees(booster):
+    """The trees XGBRegressor.predict uses: up to the best iteration, if recorded."""
+    best = booster.attr("best_iteration")
+    rounds = int(best) + 1 if best is not None else booster.num_boosted_rounds()
+    return booster[:rounds]
+
+
+def export_booster(booster):
+    """
+    Flatten an xgboost Booster (gbtree, single target) into padded arrays.
+    Trees past an early-stopped model's best iteration are left out, as
+    XGBRegressor.predict leaves them out.
+    """
+    model = json.loads(serving_trees(booster).save_raw("json"))
+    learner = model["learner"]
+    objective = learner["objective"]["name"]
+    if objective not in (
+        "reg:squarederror",
+        "reg:absoluteerror",
+        "reg:pseudohubererror",
+    ):
+        raise ValueError(f"unsupported objective {objective}")
+    if learner["gradient_booster"]["name"] != "gbtree":
+        raise ValueError("only gbtree models can be compiled")
+
+    trees = learner["gradient_booster"]["model"]["trees"]
+    n_trees = len(trees)
+    n_nodes = max(len(t["left_children"]) for t in trees)
+
+    feature = np.zeros((n_trees, n_nodes), dtype=np.int32)
+    threshold = np.zeros((n_trees, n_nodes), dtype=np.float32)
+    left = np.zeros((n_trees, n_nodes), dtype=np.int32)
+    right = np.zeros((n_trees, n_nodes), dtype=np.int32)
+    default_left = np.zeros((n_trees, n_nodes), dtype=bool)
+    value = np.zeros((n_trees, n_nodes), dtype=np.float32)
+    max_depth = 0
+
+    for i, tree in enumerate(trees):
+        if any(tree["split_type"]):
+            raise ValueError("categorical splits are not supported")
+        lc = np.array(tree["left_children"], dtype=np.int32)
+        rc = np.array(tree["right_children"], dtype=np.int32)
+        n = len(lc)
+        is_leaf = lc == -1
+        nodes = np.arange(n, dtype=np.int32)
+
+        feature[i, :n] = tree["split_indices"]
+        threshold[i, :n] = tree["split_conditions"]
+        # leaves point at themselves so extra levels of the walk are no-ops
+        left[i, :n] = np.where(is_leaf, nodes, lc)
+        right[i, :n] = np.where(is_leaf, nodes, rc)
+        default_left[i, :n] = np.array(tree["default_left"], dtype=bool)
+        value[i, :n] = np.where(is_leaf, threshold[i, :n], 0.0)
+
+        depth = np.zeros(n, dtype=np.int32)
+        for node in range(n):
+            if not is_leaf[node]:
+                depth[lc[node]] = depth[rc[node]] = depth[node] + 1
+        max_depth = max(max_depth, int(depth.max()))
+
+    base_score = float(
+        learner["learner_model_param"]["base_score"].strip("[]").split(",")[0]
+    )
+    return {
+        "feature": feature,
+        "threshold": threshold,
+        "left": left,
+        "right": right,
+        "default_left": default_left,
+        "value": value,
+        "base_score": np.float32(base_score),
+        "max_depth": np.int32(max_depth),
+        "n_features": np.int32(int(learner["learner_model_param"]["num_feature"])),
+        "feature_names": np.array(learner["feature_names"], dtype=str),
+    }
+
+
+class CompiledModel:
+    """
+    Pure-NumPy stand-in for XGBRegressor.predict on an exported model.
+
+    On load every tree is padded out to a complete binary tree of depth
+    max_depth (a leaf above the bottom becomes an always-left split whose
+    descendants all carry its value), so node i's children are 2i+1 and
+    2i+2. All trees are then walked together one level at a time: each step
+    gathers the split of every (row, tree) pair's current node and moves it
+    left or right, with NaN following the node's default direction.
+    """
+
+    def __init__(self, arrays):
+        self.max_depth = int(arrays["max_depth"])
+        self.base_score = np.float32(arrays["base_score"])
+        self.n_features = int(arrays["n_features"])
+        self.feature_names = [str(n) for n in arrays["feature_names"]]
+        self.n_trees = len(arrays["feature"])
+
+        n_inner = 2**self.max_depth - 1
+        n_leaves = 2**self.max_depth
+        feature = np.zeros((self.n_trees, n_inner), dtype=np.int32)
+        threshold = np.full((self.n_trees, n_inner), np.inf, dtype=np.float32)
+        default_left = np.ones((self.n_trees, n_inner), dtype=bool)
+        value = np.zeros((self.n_trees, n_leaves), dtype=np.float32)
+        for t in range(self.n_trees):
+            # (original node, complete-tree position, depth)
+            stack = [(0, 0, 0)]
+            while stack:
+                node, pos, depth = stack.pop()
+                if arrays["left"][t, node] == node:
+                    # leaf: fill every bottom slot under this position
+                    first = (pos + 1) * 2 ** (self.max_depth - depth) - 1 - n_inner
+                    value[t, first : first + 2 ** (self.max_depth - depth)] = arrays[
+                        "value"
+                    ][t, node]
+                    continue
+                feature[t, pos] = arrays["feature"][t, node]
+                threshold[t, pos] = arrays["threshold"][t, node]
+                default_left[t, pos] = arrays["default_left"][t, node]
+                stack.append((arrays["left"][t, node], 2 * pos + 1, depth + 1))
+                stack.append((arrays["right"][t, node], 2 * pos + 2, depth + 1))
+
+        # flattened so one gather fetches a node from every tree at once
+        self._feature = feature.ravel()
+        self._threshold = threshold.ravel()
+        self._default_left = default_left.ravel()
+        self._value = value.ravel()
+        self._inner_offset = np.arange(self.n_trees, dtype=np.int32) * n_inner
+        self._leaf_offset = np.arange(self.n_trees, dtype=np.int32) * n_leaves - n_inner
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as npz:
+            return cls({name: npz[name] for name in npz.files})
+
+    def num_features(self):
+        return self.n_features
+
+    def predict(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"expected {self.n_features} features, got {X.shape}")
+        out = np.empty(len(X), dtype=np.float32)
+        for start in range(0, len(X), EVAL_CHUNK):
+            out[start : start + EVAL_CHUNK] = self._predict_chunk(
+                X[start : start + EVAL_CHUNK]
+            )
+        return out
+
+    def _predict_chunk(self, X):
+        n = len(X)
+        has_nan = bool(np.isnan(X).any())
+        row_base = (np.arange(n, dtype=np.int32) * self.n_features)[:, None]
+        flat_x = X.ravel()
+        pos = np.zeros((n, self.n_trees), dtype=np.int32)
+        for _ in range(self.max_depth):
+            idx = self._inner_offset + pos
+            x = flat_x[row_base + self._feature[idx]]
+            go_left = x < self._threshold[idx]
+            if has_nan:
+                go_left = np.where(np.isnan(x), self._default_left[idx], go_left)
+            pos = 2 * pos + 2 - go_left
+        # xgboost starts from base_score and adds trees in order in float32;
+        # cumsum accumulates sequentially, which reproduces it bit for bit
+        leaves = np.empty((n, self.n_trees + 1), dtype=np.float32)
+        leaves[:, 0] = self.base_score
+        leaves[:, 1:] = self._value[self._leaf_offset + pos]
+        return np.cumsum(leaves, axis=1)[:, -1]
+
+
+def compile_model(model_path, out_path):
+    import xgboost as xgb
+
+    model = xgb.XGBRegressor()
+    model.load_model(model_path)
+    arrays = export_booster(model.get_booster())
+    np.savez(out_path, **arrays)
+    return model
+
+
+def verify(model, compiled, n_samples=20000, seed=0):
+    """Max absolute difference from XGBRegressor.predict on random inputs."""
+    rng = np.random.default_rng(seed)
+    lo = np.array([24.5, -125.0, 1, 1, 11] + [0] * (compiled.n_features - 5))
+    hi = np.array([49.5, -66.9, 12, 366, 95] + [100] * (compiled.n_features - 5))
+    X = rng.uniform(lo, hi, size=(n_samples, compiled.n_features)).astype(np.float32)
+    X[:, 2:5] = np.round(X[:, 2:5])
+    X[rng.random(X.shape) < 0.01] = np.nan
+    expected = model.predict(X)
+    return float(np.max(np.abs(compiled.predict(X) - expected)))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python -m firespot_shared.treeeval <model.ubj> <out.npz>")
+        sys.exit(1)
+
+    model = compile_model(sys.argv[1], sys.argv[2])
+    compiled = CompiledModel.load(sys.argv[2])
+    err = verify(model, compiled)
+    print(
+        f"Compiled {compiled.n_trees} trees (depth {compiled.max_depth}) "
+        f"to {sys.argv[2]}; max |diff| vs xgboost: {err:.3g}"
+    )
+    if err > 1e-6:
+        print("Compiled model does not match xgboost")
+        sys.exit(1)